@@ -0,0 +1,73 @@
+"""Tokens sent per follow-up turn: full resend versus incremental context.
+
+Simulates a feedback loop over several tagged sections where one section is
+edited between turns, and compares the tokens sent by the old approach
+(the whole prompt plus feedback, every turn) with a `Conversation`.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_conversation.py [--turns N]
+```
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from coderip.conversation import Conversation, format_sections
+from coderip.providers import estimate_tokens
+
+
+def make_sections(count: int, lines: int) -> dict:
+    return {
+        f"section_{i}": "\n".join(f"{j + 1}: value_{i}_{j} = compute({j})" for j in range(lines))
+        for i in range(count)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--sections', type=int, default=5)
+    parser.add_argument('--lines', type=int, default=60)
+    parser.add_argument('--max-tokens', type=int, default=16000)
+    args = parser.parse_args()
+
+    logger.remove()
+    sections = make_sections(args.sections, args.lines)
+    request = "Please refactor these sections."
+    full_prompt = f"Please modify the following code sections as needed:\n```\n{format_sections(sections)}\n```\n{request}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        conversation = Conversation("bench", max_tokens=args.max_tokens, directory=directory)
+        conversation.add_user_turn(request, sections)
+        conversation.add_assistant_turn("Done.")
+        print(f"{'turn':>4} {'full resend':>12} {'incremental':>12} {'in context':>11}")
+        total_full = total_incremental = 0
+        for turn_index in range(1, args.turns + 1):
+            edited = f"section_{turn_index % args.sections}"
+            sections[edited] += f"\n# edit {turn_index}"
+            feedback = f"Feedback: that broke test {turn_index}, please fix it."
+
+            full_tokens = estimate_tokens(f"{full_prompt}\n{feedback}\nAdjusted command:")
+            turn = conversation.add_user_turn(feedback, sections)
+            conversation.add_assistant_turn(f"Fixed {edited}.")
+            conversation.save()
+
+            total_full += full_tokens
+            total_incremental += turn.tokens
+            print(f"{turn_index:>4} {full_tokens:>12} {turn.tokens:>12} {conversation.prompt_tokens():>11}")
+
+        resumed = Conversation.load("bench", directory)
+        assert resumed.messages() == conversation.messages()
+    print(f"total {total_full:>11} {total_incremental:>12} ({total_incremental / total_full:.0%})")
+
+
+if __name__ == "__main__":
+    main()
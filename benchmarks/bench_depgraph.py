@@ -0,0 +1,129 @@
+"""Dependency index build, cache and lookup latency on a large synthetic repo.
+
+Generates Python modules whose functions call functions in other modules,
+then times:
+
+- building the index from scratch (parsing every file)
+- saving it, and a warm start: loading the cache and checking every file
+- updating it after one file changed
+- `related` lookups for one to three selected functions
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_depgraph.py [--files 2000] [--functions 20]
+```
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from coderip.depgraph import DependencyIndex
+
+
+def make_module(rng: random.Random, index: int, files: int, functions: int) -> str:
+    out = [f'"""Generated module {index}."""', "", f"LIMIT_{index} = {rng.randint(1, 100)}", ""]
+    for k in range(functions):
+        calls = [f"func_{rng.randrange(files)}_{rng.randrange(functions)}" for _ in range(3)]
+        out += [
+            "",
+            f"def func_{index}_{k}(value, scale=LIMIT_{index}):",
+            f'    """Computes step {k} of module {index}."""',
+            "    total = 0",
+            "    for item in range(value):",
+            *(f"        total += {call}(item) * scale" for call in calls),
+            "    return total",
+        ]
+    out += ["", "", f"class Handler{index}:", "    def handle(self, value):", f"        return func_{index}_0(value)", ""]
+    return "\n".join(out)
+
+
+def p50_p95(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+    return f"p50={p50:8.3f}ms  p95={p95:8.3f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--functions', type=int, default=20, help='Functions per module')
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--budget', type=int, default=2000, help='Token budget per lookup')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logger.remove()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(root, f"module_{i}.py")
+            with open(path, "w") as file:
+                file.write(make_module(rng, i, args.files, args.functions))
+            paths.append(path)
+        cache_path = os.path.join(root, "depindex.json")
+
+        # No background saves while timing
+        index = DependencyIndex(cache_path=None)
+        start = time.perf_counter()
+        for path in paths:
+            index.update_file(path)
+        build = time.perf_counter() - start
+        definitions = sum(len(symbols.definitions) for symbols in index.files.values())
+        print(f"{args.files} files, {definitions} definitions\n")
+        print(f"build from scratch        {build:8.2f}s  ({args.files / build:.0f} files/s)")
+
+        index.cache_path = cache_path
+        start = time.perf_counter()
+        index.save()
+        print(f"save                      {time.perf_counter() - start:8.2f}s  "
+              f"({os.path.getsize(cache_path) / 1e6:.1f}MB)")
+
+        start = time.perf_counter()
+        index = DependencyIndex.load(cache_path)
+        for path in paths:
+            index.update_file(path)
+        print(f"warm start (load + check) {time.perf_counter() - start:8.2f}s")
+        index.cache_path = None
+
+        latencies = []
+        for i in range(20):
+            path = rng.choice(paths)
+            with open(path, "a") as file:
+                file.write(f"\n\ndef extra_{i}(value):\n    return func_0_0(value)\n")
+            start = time.perf_counter()
+            index.update_file(path)
+            latencies.append(time.perf_counter() - start)
+        print(f"update one file           {p50_p95(latencies)}")
+
+        functions = [
+            definition for symbols in index.files.values()
+            for definition in symbols.definitions if definition.kind == "function"
+        ]
+        latencies, counts = [], []
+        for _ in range(args.lookups):
+            selections = [
+                (definition.path, definition.start, definition.end)
+                for definition in rng.sample(functions, rng.randint(1, 3))
+            ]
+            start = time.perf_counter()
+            related = index.related(selections, args.budget)
+            latencies.append(time.perf_counter() - start)
+            counts.append(len(related))
+        print(f"related lookup            {p50_p95(latencies)}  "
+              f"({statistics.median(counts):.0f} definitions within {args.budget} tokens)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Re-parse latency of a large file after single-line edits.
+
+Generates a 100k-line source file with tagged sections (see `synthetic.py`),
+then repeatedly edits one line (replacing, inserting or deleting it, near the
+top, middle or bottom) and times:
+
+- full: `FileIndex.build`, re-parsing the whole file
+- incremental: `FileIndex.update` from the index of the previous version
+
+Every incremental result is checked against the full re-parse.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_incremental.py [--lines 100000] [--edits 200]
+```
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from coderip.fileindex import FileIndex
+from synthetic import make_source
+
+
+def edit(rng: random.Random, lines: list, region: str):
+    span = len(lines) // 3
+    start = {"top": 0, "middle": span, "bottom": 2 * span}[region]
+    index = rng.randrange(start, start + span)
+    kind = rng.choice(["replace", "insert", "delete"])
+    if lines[index].startswith("#|"):
+        # Leave tags alone so that every version has the same sections
+        kind = "insert"
+    if kind == "replace":
+        lines[index] = f"edited_{rng.random()} = 1\n"
+    elif kind == "insert":
+        lines.insert(index, f"inserted_{rng.random()} = 1\n")
+    else:
+        del lines[index]
+
+
+def report(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000
+    print(f"{name:<26} p50={p50:8.3f}ms  p95={p95:8.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--edits', type=int, default=200)
+    parser.add_argument('--tag-density', type=float, default=0.002)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lines = make_source(rng, args.lines, args.tag_density, 0, []).splitlines(keepends=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.py")
+        with open(path, "w") as file:
+            file.writelines(lines)
+        index = FileIndex.build(path)
+        print(f"{len(lines)} lines, {index.size / 1e6:.1f}MB, {len(index.sections())} sections\n")
+
+        for region in ("top", "middle", "bottom"):
+            full, incremental, parsed = [], [], []
+            for i in range(args.edits):
+                edit(rng, lines, region)
+                with open(path, "w") as file:
+                    file.writelines(lines)
+                # Make sure the change is visible even with coarse mtimes
+                os.utime(path, (i, i))
+
+                start = time.perf_counter()
+                rebuilt = FileIndex.build(path)
+                full.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                index = index.update(path)
+                incremental.append(time.perf_counter() - start)
+                parsed.append(index.parsed_bytes)
+
+                assert index.events == rebuilt.events, "incremental events differ from a full re-parse"
+                assert index.sections() == rebuilt.sections()
+            print(f"Edits near the {region} (parsed {statistics.median(parsed) / 1024:.1f}KB median)")
+            report("  full re-parse", full)
+            report("  incremental re-parse", incremental)
+            print(f"  speedup (p50)              {statistics.median(full) / statistics.median(incremental):.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
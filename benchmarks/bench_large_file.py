@@ -0,0 +1,114 @@
+"""Peak RSS and latency of section extraction from a very large file.
+
+Writes a multi-hundred-MB file with a 20-line tagged section near the end,
+then, each in a fresh process so that peak RSS is measured in isolation:
+
+- readlines: the previous approach, reading every line to slice the section
+- index: building a `FileIndex` (mmap scan of the whole file)
+- extract: slicing the section out with a prebuilt `FileIndex`
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_large_file.py [--size-mb 300]
+```
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coderip.fileindex import FileIndex
+
+FILLER_LINE = "DATA = [0x%08x, 'generated payload that makes this module very large']\n"
+
+
+def write_large_file(path: str, size_mb: int) -> int:
+    """Writes the file and returns the 0-indexed line of the section's open tag."""
+    target = size_mb * 1024 * 1024
+    block = "".join(FILLER_LINE % i for i in range(10000))
+    lines_per_block = 10000
+    written, lines = 0, 0
+    with open(path, "w") as file:
+        while written < target:
+            file.write(block)
+            written += len(block)
+            lines += lines_per_block
+        file.write("#|open:needle\n")
+        for i in range(20):
+            file.write(f"needle_{i} = {i}\n")
+        file.write("#|close:needle\n")
+        file.write(block)
+    return lines
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_readlines(path: str, open_line: int, queue):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with open(path, "r") as file:
+        lines = file.readlines()
+    code = "".join(lines[open_line + 1:open_line + 21])
+    queue.put((time.perf_counter() - start, peak_rss_mb() - baseline, code))
+
+
+def run_index(path: str, open_line: int, queue):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    index = FileIndex.build(path)
+    start_line, end_line, _ = index.sections()[0]
+    code = index.read_lines(path, start_line, end_line)
+    queue.put((time.perf_counter() - start, peak_rss_mb() - baseline, code))
+
+
+def run_extract(path: str, index: FileIndex, queue):
+    baseline = peak_rss_mb()
+    start_line, end_line, _ = index.sections()[0]
+    start = time.perf_counter()
+    code = index.read_lines(path, start_line, end_line)
+    queue.put((time.perf_counter() - start, peak_rss_mb() - baseline, code))
+
+
+def measure(target, *args):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "generated.py")
+        open_line = write_large_file(path, args.size_mb)
+        print(f"Wrote {os.path.getsize(path) / 1e6:.0f}MB, section at line {open_line + 1}")
+
+        index = FileIndex.build(path)
+        expected = "".join(f"needle_{i} = {i}\n" for i in range(20))
+        for name, target, extra in (
+            ("readlines + slice", run_readlines, open_line),
+            ("index (full scan) + slice", run_index, open_line),
+            ("slice with prebuilt index", run_extract, index),
+        ):
+            latency, rss, code = measure(target, path, extra)
+            assert code == expected, f"{name} extracted the wrong lines"
+            print(f"{name:<28} latency={latency * 1000:10.2f}ms  peak RSS increase={rss:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Recovery rate and speed of the model response parser.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_parser.py [--iterations N]
+```
+
+Exits non-zero if any corpus case is not recovered.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from coderip.parser import parse_response
+from parser_corpus import CASES
+
+
+def check_corpus(verbose: bool = False) -> list:
+    failures = []
+    for case in CASES:
+        parsed = parse_response(case["response"], labels=case["labels"], first_lines=case.get("first_lines"))
+        if parsed.sections != case["expected"]:
+            failures.append((case["name"], parsed))
+        if verbose:
+            print(f"{case['name']}: {parsed.issues}")
+    return failures
+
+
+def time_corpus(iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for case in CASES:
+            parse_response(case["response"], labels=case["labels"], first_lines=case.get("first_lines"))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    failures = check_corpus(args.verbose)
+    recovered = len(CASES) - len(failures)
+    print(f"Recovered {recovered}/{len(CASES)} cases ({recovered / len(CASES):.0%})")
+    for name, parsed in failures:
+        print(f"  FAILED {name}: sections={parsed.sections!r} issues={parsed.issues!r}")
+
+    elapsed = time_corpus(args.iterations)
+    parses = args.iterations * len(CASES)
+    print(f"Parsed {parses} responses in {elapsed:.3f}s ({elapsed / parses * 1e6:.1f}us/response)")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Per-request latency of the local provider against the mock LLM server.
+
+Compares follow-up requests with and without prompt prefix reuse, and a batch
+of independent requests sent sequentially versus concurrently.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_provider.py [--requests N]
+```
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from coderip import config
+from coderip.mock_server import MockLLMServer
+from coderip.providers import LocalProvider
+
+
+def make_context(lines: int) -> str:
+    code = "\n".join(f"{i + 1}: value_{i} = compute({i})" for i in range(lines))
+    return f"#|open:context\n{code}\n#|close:context"
+
+
+def summarize(name: str, latencies: list, elapsed: float = None):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    line = (
+        f"{name:<28} mean={statistics.mean(latencies) * 1000:7.1f}ms "
+        f"p50={statistics.median(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms"
+    )
+    if elapsed is not None:
+        line += f" wall={elapsed * 1000:7.1f}ms"
+    print(line)
+
+
+def follow_ups(provider: LocalProvider, context: str, requests: int):
+    messages = [
+        {"role": "system", "content": config.SYSTEM_MESSAGE},
+        {"role": "user", "content": context},
+    ]
+    latencies, cached = [], 0
+    for i in range(requests):
+        messages = messages + [{"role": "user", "content": f"Follow-up {i}: rename value_{i}."}]
+        response = provider.complete(messages, session="bench")
+        latencies.append(response.latency)
+        cached += response.cached_tokens
+        messages.append({"role": "assistant", "content": response.content})
+    return latencies, cached
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=8)
+    parser.add_argument('--context-lines', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--token-latency', type=float, default=0.00002)
+    parser.add_argument('--slots', type=int, default=4)
+    args = parser.parse_args()
+
+    logger.remove()
+    context = make_context(args.context_lines)
+
+    with MockLLMServer(latency=args.latency, token_latency=args.token_latency, slots=args.slots) as server:
+        for cache_prompt in (False, True):
+            provider = LocalProvider(base_url=server.url, slots=args.slots, cache_prompt=cache_prompt)
+            latencies, cached = follow_ups(provider, context, args.requests)
+            summarize(f"follow-ups cache_prompt={cache_prompt}", latencies)
+            print(f"{'':<28} cached_tokens={cached}")
+
+        provider = LocalProvider(base_url=server.url, slots=args.slots)
+        batch = [
+            [{"role": "user", "content": f"{context}\nRequest {i}"}]
+            for i in range(args.requests)
+        ]
+
+        start = time.perf_counter()
+        sequential = [provider.complete(messages) for messages in batch]
+        summarize("batch sequential", [r.latency for r in sequential], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        concurrent = provider.complete_batch(batch, sessions=[f"job-{i}" for i in range(len(batch))])
+        summarize("batch concurrent", [r.latency for r in concurrent], time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
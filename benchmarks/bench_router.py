@@ -0,0 +1,90 @@
+"""Failover and hedging against stub servers with injected latency and faults.
+
+Runs three scenarios against two mock LLM servers and reports success rate
+and latency for each:
+
+- primary down: every request must fail over to the secondary
+- primary flaky: a fraction of requests fail and are retried elsewhere
+- primary slow tail: hedged requests cut the tail latency
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_router.py [--requests N]
+```
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+
+from coderip.mock_server import MockLLMServer
+from coderip.providers import LocalProvider, ModelError
+from coderip.router import ProviderRouter
+
+
+def run(router: ProviderRouter, requests: int) -> dict:
+    latencies, failures, providers = [], 0, {}
+    for i in range(requests):
+        messages = [{"role": "user", "content": f"#|open:foo\nx = {i}\n#|close:foo"}]
+        start = time.perf_counter()
+        try:
+            response = router.complete(messages)
+        except ModelError:
+            failures += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+        providers[response.model] = providers.get(response.model, 0) + 1
+    latencies.sort()
+    return {
+        "ok": requests - failures,
+        "failed": failures,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else None,
+        "served_by": providers,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<34} ok={result['ok']:<3} failed={result['failed']:<3} "
+        f"p50={result['p50_ms']:6.1f}ms p95={result['p95_ms']:6.1f}ms served_by={result['served_by']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+
+    logger.remove()
+
+    with MockLLMServer(latency=args.latency) as primary, MockLLMServer(latency=args.latency * 2) as secondary:
+        def make_router(**kwargs) -> ProviderRouter:
+            return ProviderRouter([
+                LocalProvider(base_url=primary.url, model="primary"),
+                LocalProvider(base_url=secondary.url, model="secondary"),
+            ], **kwargs)
+
+        primary.down = True
+        report("primary down, failover", run(make_router(), args.requests))
+        primary.down = False
+
+        primary.error_rate = 0.3
+        report("primary 30% errors, failover", run(make_router(cooldown=0.05), args.requests))
+        primary.error_rate = 0.0
+
+        primary.slow_rate, primary.slow_latency = 0.2, 0.2
+        report("primary slow tail, no hedging", run(make_router(), args.requests))
+        report("primary slow tail, hedge 20ms", run(make_router(hedge_after=0.02), args.requests))
+
+
+if __name__ == "__main__":
+    main()
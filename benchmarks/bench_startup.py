@@ -0,0 +1,88 @@
+"""Time to interactive with working-set-first scanning.
+
+Creates a git repository of tagged files with old modification times, edits a
+few of them, and compares the time until tags are available when scanning the
+working set first against a full scan of the directory.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_startup.py [--files N] [--modified N]
+```
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loguru import logger
+
+from coderip.main import TagFinder
+from synthetic import TreeSpec, generate_tree
+
+OLD_MTIME = time.time() - 90 * 24 * 3600
+
+
+def make_repo(directory: str, spec: TreeSpec, modified: int):
+    tree = generate_tree(directory, spec)
+    for path in tree.text_files + tree.binary_files:
+        os.utime(path, (OLD_MTIME, OLD_MTIME))
+    git = ["git", "-C", directory, "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run(git + ["init", "-q"], check=True)
+    subprocess.run(git + ["add", "."], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "synthetic"], check=True)
+    for path in tree.text_files[:modified]:
+        with open(path, "a") as file:
+            file.write("# edited\n")
+
+
+def scan(directory: str, working_set_first: bool) -> TagFinder:
+    tag_finder = TagFinder()
+    tag_finder.schedule_display_tags = lambda: None
+    if working_set_first:
+        tag_finder.scan_directory(directory)
+    else:
+        start = time.perf_counter()
+        tag_finder._scan_remaining(directory, set())
+        tag_finder.time_to_interactive = time.perf_counter() - start
+        tag_finder.backfill_completed.set()
+    return tag_finder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--modified', type=int, default=10)
+    args = parser.parse_args()
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        make_repo(directory, TreeSpec(files=args.files, lines=args.lines), args.modified)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            full = scan(".", working_set_first=False)
+            print(f"full scan:         time to interactive {full.time_to_interactive * 1000:8.1f}ms")
+
+            start = time.perf_counter()
+            incremental = scan(".", working_set_first=True)
+            print(
+                f"working set first: time to interactive {incremental.time_to_interactive * 1000:8.1f}ms "
+                f"({len(incremental.working_set.paths)} files)"
+            )
+            incremental.backfill_completed.wait()
+            print(f"                   backfill complete    {(time.perf_counter() - start) * 1000:8.1f}ms")
+            assert len(incremental.tag_data) == len(full.tag_data)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Parallel verification of candidate edits.
+
+Builds a synthetic git repository with a `check.py` whose tagged `verdict`
+section decides whether the "test command" passes; it also sleeps, standing
+in for a test suite. Each candidate rewrites the section, and only one of
+them passes. For each isolation method this times:
+
+- creating and removing a workspace
+- verifying the candidates one at a time (all run to completion)
+- verifying them in parallel (all run to completion)
+- verifying them in parallel until the first passes
+
+Usage:
+
+```
+    $ poetry run python benchmarks/bench_verify.py [--candidates 4] [--sleep 1.0]
+```
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from loguru import logger
+
+from coderip.edits import Edit
+from coderip.verify import Verifier, WorkspaceFactory
+from synthetic import TreeSpec, generate_tree
+
+CHECK_SOURCE = """import sys
+import time
+
+#|open:verdict
+PASS = False
+#|close:verdict
+
+time.sleep({sleep})
+print("checked", PASS)
+sys.exit(0 if PASS else 1)
+"""
+
+
+def make_repository(root: str, files: int, sleep: float):
+    generate_tree(root, TreeSpec(files=files, binary_ratio=0.0))
+    with open(os.path.join(root, "check.py"), "w") as file:
+        file.write(CHECK_SOURCE.format(sleep=sleep))
+    for command in (["init", "-q"], ["add", "-A"], ["-c", "user.name=bench", "-c", "user.email=bench@example.com",
+                                                    "commit", "-q", "-m", "tree"]):
+        subprocess.run(["git", "-C", root, *command], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--candidates', type=int, default=4)
+    parser.add_argument('--sleep', type=float, default=1.0, help='Seconds the test command takes')
+    parser.add_argument('--repeat', type=int, default=5, help='Workspaces to time per isolation method')
+    args = parser.parse_args()
+
+    logger.remove()
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "repo")
+        make_repository(root, args.files, args.sleep)
+        check_path = os.path.join(root, "check.py")
+        # Only the last candidate passes, the worst case for finding it
+        candidates = {
+            f"candidate_{i}": [Edit(path=check_path, code=f"PASS = {i == args.candidates}", label="verdict")]
+            for i in range(1, args.candidates + 1)
+        }
+        command = f"{sys.executable} check.py"
+        print(f"{args.files} files, {args.candidates} candidates, test command takes {args.sleep}s\n")
+
+        for isolation in ("worktree", "hardlink"):
+            factory = WorkspaceFactory(root, isolation)
+            durations = []
+            for i in range(args.repeat):
+                start = time.perf_counter()
+                factory.create(f"bench_{i}").remove()
+                durations.append(time.perf_counter() - start)
+            print(f"{isolation}: create + remove workspace p50={statistics.median(durations) * 1000:.1f}ms")
+
+            log_dir = os.path.join(directory, "logs", isolation)
+            for name, parallel, wait_all in (
+                ("serial, all", 1, True),
+                ("parallel, all", args.candidates, True),
+                ("parallel, first pass", args.candidates, False),
+            ):
+                verifier = Verifier(root, command, parallel=parallel, isolation=isolation, log_dir=log_dir)
+                report = verifier.verify(candidates, wait_all=wait_all)
+                assert report.first_passed == f"candidate_{args.candidates}", report.summary()
+                print(f"  {name:<22} {report.elapsed:8.2f}s")
+            print()
+
+
+if __name__ == "__main__":
+    main()
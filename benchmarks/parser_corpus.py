@@ -0,0 +1,267 @@
+"""Corpus of model responses for the response parser benchmark.
+
+Each case records the labels sent to the model (and, for sections sent with
+line numbers, the number of their first line), the raw response and the
+sections we expect to recover from it.
+"""
+
+FENCE = "```"
+
+CASES = [
+    {
+        "name": "well_formed",
+        "labels": ["foo"],
+        "response": f"""Here you go:
+{FENCE}python
+#|open:foo
+def foo():
+    return 1
+#|close:foo
+{FENCE}
+""",
+        "expected": {"foo": "def foo():\n    return 1"},
+    },
+    {
+        "name": "two_sections",
+        "labels": ["foo", "bar"],
+        "response": f"""{FENCE}python
+#|open:foo
+def foo():
+    return 1
+#|close:foo
+#|open:bar
+def bar():
+    return 2
+#|close:bar
+{FENCE}""",
+        "expected": {"foo": "def foo():\n    return 1", "bar": "def bar():\n    return 2"},
+    },
+    {
+        "name": "prompt_style_open_tag",
+        "labels": ["foo"],
+        "response": """#|open:foo>
+x = 1
+#|close:foo""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "line_numbers",
+        "labels": ["foo"],
+        "response": f"""{FENCE}
+#|open:foo
+12: def foo():
+13:     return 1
+#|close:foo
+{FENCE}""",
+        "expected": {"foo": "def foo():\n    return 1"},
+    },
+    {
+        "name": "dict_literal_not_stripped",
+        "labels": ["foo"],
+        "response": """#|open:foo
+NAMES = {
+1: "one",
+2: "two",
+}
+#|close:foo""",
+        "expected": {"foo": 'NAMES = {\n1: "one",\n2: "two",\n}'},
+    },
+    {
+        "name": "numbered_dict_literal_not_stripped",
+        "labels": ["foo"],
+        "response": """#|open:foo
+d = {
+1: 'a',
+2: 'b',
+3: 'c',
+}
+#|close:foo""",
+        "expected": {"foo": "d = {\n1: 'a',\n2: 'b',\n3: 'c',\n}"},
+    },
+    {
+        "name": "numbered_dict_literal_with_first_line",
+        "labels": ["foo"],
+        "first_lines": {"foo": 12},
+        "response": """#|open:foo
+d = {
+1: 'a',
+2: 'b',
+}
+#|close:foo""",
+        "expected": {"foo": "d = {\n1: 'a',\n2: 'b',\n}"},
+    },
+    {
+        "name": "line_numbers_inserted_line",
+        "labels": ["foo"],
+        "first_lines": {"foo": 2},
+        "response": """#|open:foo
+2: def f():
+    x = 1
+3:     return x
+#|close:foo""",
+        "expected": {"foo": "def f():\n    x = 1\n    return x"},
+    },
+    {
+        "name": "line_numbers_deleted_line",
+        "labels": ["foo"],
+        "first_lines": {"foo": 12},
+        "response": """#|open:foo
+12: def foo():
+14:     return 1
+#|close:foo""",
+        "expected": {"foo": "def foo():\n    return 1"},
+    },
+    {
+        "name": "line_numbers_renumbered",
+        "labels": ["foo"],
+        "first_lines": {"foo": 12},
+        "response": """#|open:foo
+1: def foo():
+2:     x = 1
+3:     return x
+#|close:foo""",
+        "expected": {"foo": "def foo():\n    x = 1\n    return x"},
+    },
+    {
+        "name": "missing_close_end_of_response",
+        "labels": ["foo"],
+        "response": """#|open:foo
+def foo():
+    return 1""",
+        "expected": {"foo": "def foo():\n    return 1"},
+    },
+    {
+        "name": "missing_close_fence_ends",
+        "labels": ["foo"],
+        "response": f"""{FENCE}python
+#|open:foo
+def foo():
+    return 1
+{FENCE}
+Let me know if you need anything else.""",
+        "expected": {"foo": "def foo():\n    return 1"},
+    },
+    {
+        "name": "missing_close_reopened",
+        "labels": ["foo", "bar"],
+        "response": """#|open:foo
+a = 1
+#|open:bar
+b = 2
+#|close:bar
+#|open:foo
+a = 3
+#|close:foo""",
+        "expected": {"foo": "a = 3", "bar": "b = 2"},
+    },
+    {
+        "name": "missing_inner_close",
+        "labels": ["outer", "inner"],
+        "response": """#|open:outer
+x = 1
+#|open:inner
+y = 2
+#|close:outer""",
+        "expected": {"outer": "x = 1\n#|open:inner\ny = 2", "inner": "y = 2"},
+    },
+    {
+        "name": "mismatched_label",
+        "labels": ["foo"],
+        "response": """#|open:foo
+x = 1
+#|close:fooo""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "unlabeled_close",
+        "labels": ["foo"],
+        "response": """#|open:foo
+x = 1
+#|close""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "unlabeled_open",
+        "labels": ["foo"],
+        "response": """#|open
+x = 1
+#|close:foo""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "missing_open_inside_fence",
+        "labels": ["foo"],
+        "response": f"""{FENCE}python
+x = 1
+#|close:foo
+{FENCE}""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "fence_inside_section",
+        "labels": ["foo"],
+        "response": f"""#|open:foo
+{FENCE}python
+x = 1
+{FENCE}
+#|close:foo""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "bare_fence_inside_section_inside_fence",
+        "labels": ["foo"],
+        "response": f"""{FENCE}python
+#|open:foo
+{FENCE}
+x = 1
+{FENCE}
+#|close:foo
+{FENCE}""",
+        "expected": {"foo": "x = 1"},
+    },
+    {
+        "name": "nested_fence_in_docstring",
+        "labels": ["foo"],
+        "response": f"""{FENCE}python
+#|open:foo
+def foo():
+    \"\"\"Example:
+
+    {FENCE}python
+    foo()
+    {FENCE}
+    \"\"\"
+#|close:foo
+{FENCE}""",
+        "expected": {"foo": f'def foo():\n    """Example:\n\n    {FENCE}python\n    foo()\n    {FENCE}\n    """'},
+    },
+    {
+        "name": "no_tags_single_block",
+        "labels": ["foo"],
+        "response": f"""Sure, here is the fix:
+{FENCE}python
+def foo():
+    return 2
+{FENCE}""",
+        "expected": {"foo": "def foo():\n    return 2"},
+    },
+    {
+        "name": "no_tags_blocks_in_order",
+        "labels": ["foo", "bar"],
+        "response": f"""First:
+{FENCE}python
+a = 1
+{FENCE}
+Second:
+{FENCE}python
+b = 2
+{FENCE}""",
+        "expected": {"foo": "a = 1", "bar": "b = 2"},
+    },
+    {
+        "name": "crlf",
+        "labels": ["foo"],
+        "response": "#|open:foo\r\nx = 1\r\n#|close:foo\r\n",
+        "expected": {"foo": "x = 1"},
+    },
+]
@@ -0,0 +1,280 @@
+"""Benchmark suite with regression gates.
+
+Generates a synthetic tree (see `synthetic.py`) and measures:
+
+- `TagFinder.scan_directory` throughput
+- `TagFinder.update_tags` latency while files churn
+- `TagFinder.get_code_by_label` latency
+- end-to-end prompt assembly: sections -> conversation -> mock LLM -> parse
+
+The timed sections run `--runs` times, interleaved, and each latency is
+reported from the fastest run (p50) or across runs (median p95), so that a
+burst of load on the machine doesn't skew one metric. Results are saved as
+JSON (by default to `benchmarks/results/<commit>.json`). With `--compare`,
+gated metrics (throughputs and medians; tail latencies are too noisy and only
+reported) that got worse than the baseline by more than `--threshold`, and by
+more than `--floor` milliseconds for latencies, are flagged and the run exits
+non-zero.
+
+Usage:
+
+```
+    $ poetry run python benchmarks/run.py --output base.json
+    $ poetry run python benchmarks/run.py --compare base.json [--threshold 0.25] [--floor 0.05]
+```
+"""
+
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from loguru import logger
+
+from coderip.conversation import Conversation
+from coderip.main import TagFinder
+from coderip.mock_server import MockLLMServer
+from coderip.parser import parse_response
+from coderip.providers import LocalProvider
+from synthetic import TreeSpec, generate_tree
+
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+
+def p95(latencies: List[float]) -> float:
+    latencies = sorted(latencies)
+    return latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+
+class Results:
+    def __init__(self):
+        self.metrics: Dict[str, dict] = {}
+        # name -> latencies of each run
+        self.runs: Dict[str, List[List[float]]] = {}
+
+    def add(self, name: str, value: float, unit: str, higher_is_better: bool = False, gate: bool = True):
+        self.metrics[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better, "gate": gate}
+        print(f"{name:<36} {value:>12.3f} {unit}")
+
+    def record(self, name: str, latencies: List[float]):
+        """Records the latencies of one run of a timed section."""
+        self.runs.setdefault(name, []).append(latencies)
+
+    def add_latencies(self, name: str):
+        """Adds the p50 of the fastest run and the median p95 across runs."""
+        runs = self.runs[name]
+        self.add(f"{name}.p50", min(statistics.median(run) for run in runs) * 1000, "ms")
+        self.add(f"{name}.p95", statistics.median(p95(run) for run in runs) * 1000, "ms", gate=False)
+
+
+def timed(function: Callable, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def make_tag_finder() -> TagFinder:
+    # Benchmarks don't need the tag display
+    return TagFinder(display=False)
+
+
+def bench_scan(results: Results, root: str, tree_bytes: int, files: int, repeat: int) -> TagFinder:
+    durations = []
+    for _ in range(repeat):
+        tag_finder = make_tag_finder()
+        durations.append(timed(tag_finder.scan_directory, root))
+        tag_finder.backfill_completed.wait()
+    best = min(durations)
+    results.add("scan.files_per_s", files / best, "files/s", higher_is_better=True)
+    results.add("scan.mb_per_s", tree_bytes / best / 1e6, "MB/s", higher_is_better=True)
+    return tag_finder
+
+
+def churn(rng: random.Random, path: str):
+    with open(path) as file:
+        lines = file.readlines()
+    index = rng.randrange(len(lines))
+    if lines[index].startswith("#|"):
+        lines.insert(index, f"churn_{rng.random()} = 1\n")
+    else:
+        lines[index] = f"churn_{rng.random()} = 1\n"
+    with open(path, "w") as file:
+        file.writelines(lines)
+
+
+def bench_update(results: Results, tag_finder: TagFinder, paths: List[str], updates: int, rng: random.Random):
+    latencies = []
+    for _ in range(updates):
+        path = rng.choice(paths)
+        churn(rng, path)
+        latencies.append(timed(tag_finder.update_tags, path))
+    results.record("update_tags", latencies)
+
+
+def bench_lookup(results: Results, tag_finder: TagFinder, labels: List[str], lookups: int, rng: random.Random):
+    latencies = [timed(tag_finder.get_code_by_label, rng.choice(labels)) for _ in range(lookups)]
+    results.record("get_code_by_label", latencies)
+
+
+def bench_prompt(
+    results: Results,
+    tag_finder: TagFinder,
+    labels: List[str],
+    rounds: int,
+    rng: random.Random,
+    provider: LocalProvider,
+):
+    assembly, model, total = [], [], []
+    with tempfile.TemporaryDirectory() as sessions:
+        for round_index in range(rounds):
+            tags = rng.sample(labels, min(3, len(labels)))
+            start = time.perf_counter()
+            conversation = Conversation(f"bench-{round_index}", directory=sessions)
+            sections = {tag: tag_finder.get_code_by_label(tag) for tag in tags}
+            conversation.add_user_turn("Please refactor these sections.", sections)
+            messages = conversation.messages()
+            assembled = time.perf_counter()
+            response = provider.complete(messages, session=conversation.session_id)
+            responded = time.perf_counter()
+            parsed = parse_response(response.content, labels=tags)
+            conversation.add_assistant_turn(response.content)
+            end = time.perf_counter()
+            if parsed.missing(tags):
+                raise RuntimeError(f"Mock response missing sections {parsed.missing(tags)}")
+            assembly.append(assembled - start + end - responded)
+            model.append(responded - assembled)
+            total.append(end - start)
+    results.record("prompt.assembly", assembly)
+    results.record("prompt.model_roundtrip", model)
+    results.record("prompt.end_to_end", total)
+
+
+def git_commit() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "-C", BENCHMARKS_DIR, "rev-parse", "--short", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode().strip() or None
+
+
+def compare(baseline: dict, current: dict, threshold: float, floor: float = 0.0) -> List[str]:
+    """Returns a description of each metric that regressed beyond `threshold`.
+
+    Latencies must also have grown by more than `floor` milliseconds, as
+    sub-millisecond timings vary by more than `threshold` between runs.
+    """
+    regressions = []
+    print(f"\n{'metric':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if not base or not base["value"]:
+            continue
+        change = (metric["value"] - base["value"]) / base["value"]
+        # Positive slowdown means worse, whichever direction is better
+        slowdown = -change if metric["higher_is_better"] else change
+        flag = ""
+        significant = metric["unit"] != "ms" or metric["value"] - base["value"] > floor
+        if slowdown > threshold and significant and metric.get("gate", True):
+            flag = " REGRESSION"
+            regressions.append(f"{name}: {base['value']:.3f} -> {metric['value']:.3f} {metric['unit']}")
+        print(f"{name:<36} {base['value']:>12.3f} {metric['value']:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--lines', type=int, default=200)
+    parser.add_argument('--tag-density', type=float, default=0.02)
+    parser.add_argument('--nesting-depth', type=int, default=3)
+    parser.add_argument('--binary-ratio', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Scan repetitions (best is kept)')
+    parser.add_argument('--iterations', type=int, default=200, help='Updates and lookups to time per run')
+    parser.add_argument('--rounds', type=int, default=20, help='End-to-end prompt rounds per run')
+    parser.add_argument('--runs', type=int, default=5, help='Runs of the timed sections (fastest is kept)')
+    parser.add_argument('--output', type=str, help='Results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', type=str, help='Baseline results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown before flagging')
+    parser.add_argument('--floor', type=float, default=0.05, help='Latency increase (ms) always allowed')
+    args = parser.parse_args()
+
+    logger.remove()
+    spec = TreeSpec(
+        files=args.files,
+        lines=args.lines,
+        tag_density=args.tag_density,
+        nesting_depth=args.nesting_depth,
+        binary_ratio=args.binary_ratio,
+        seed=args.seed,
+    )
+    rng = random.Random(args.seed)
+    results = Results()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        tree = generate_tree(root, spec)
+        print(
+            f"Generated {len(tree.text_files)} text and {len(tree.binary_files)} binary files, "
+            f"{len(tree.labels)} sections, {tree.bytes / 1e6:.1f}MB\n"
+        )
+        # TagFinder keys files by path relative to the working directory
+        os.chdir(root)
+        try:
+            tag_finder = bench_scan(results, ".", tree.bytes, spec.files, args.repeat)
+            labels = list(tree.labels)
+            with MockLLMServer() as server:
+                provider = LocalProvider(base_url=server.url)
+                for _ in range(args.runs):
+                    bench_lookup(results, tag_finder, labels, args.iterations, rng)
+                    bench_prompt(results, tag_finder, labels, args.rounds, rng, provider)
+                    bench_update(results, tag_finder, tree.text_files, args.iterations, rng)
+            for name in results.runs:
+                results.add_latencies(name)
+        finally:
+            os.chdir(cwd)
+
+    commit = git_commit()
+    data = {
+        "meta": {
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "spec": vars(spec),
+        },
+        "metrics": results.metrics,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(data, file, indent=2)
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, data, args.threshold, args.floor)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Synthetic source trees for benchmarks.
+
+Trees are generated deterministically from a seed, with configurable file
+count, file size, tag density, directory nesting depth and fraction of
+binary files.
+"""
+
+from dataclasses import dataclass, field
+from typing import List
+import os
+import random
+
+
+@dataclass
+class TreeSpec:
+    files: int = 500
+    lines: int = 200  # lines per text file
+    tag_density: float = 0.02  # tagged sections per line
+    nesting_depth: int = 3
+    binary_ratio: float = 0.05
+    seed: int = 0
+
+
+@dataclass
+class Tree:
+    root: str
+    spec: TreeSpec
+    text_files: List[str] = field(default_factory=list)
+    binary_files: List[str] = field(default_factory=list)
+    labels: List[str] = field(default_factory=list)
+    bytes: int = 0
+
+
+def _directory_for(index: int, spec: TreeSpec) -> str:
+    parts = []
+    value = index
+    for depth in range(spec.nesting_depth):
+        parts.append(f"dir_{depth}_{value % 8}")
+        value //= 8
+    return os.path.join(*parts) if parts else ""
+
+
+def make_source(rng: random.Random, lines: int, tag_density: float, file_index: int, labels: List[str]) -> str:
+    """Returns Python-like source with randomly placed (possibly nested) sections."""
+    out = []
+    open_labels = []
+    section_count = 0
+    for line_index in range(lines):
+        if rng.random() < tag_density:
+            label = f"tag_{file_index}_{section_count}"
+            section_count += 1
+            labels.append(label)
+            out.append(f"#|open:{label}")
+            open_labels.append(label)
+        elif open_labels and rng.random() < tag_density:
+            out.append(f"#|close:{open_labels.pop()}")
+        indent = "    " * (line_index % 3)
+        out.append(f"{indent}value_{line_index} = compute({line_index}, 'x' * {rng.randint(0, 40)})")
+    while open_labels:
+        out.append(f"#|close:{open_labels.pop()}")
+    return "\n".join(out) + "\n"
+
+
+def generate_tree(root: str, spec: TreeSpec) -> Tree:
+    rng = random.Random(spec.seed)
+    tree = Tree(root=root, spec=spec)
+    for i in range(spec.files):
+        directory = os.path.join(root, _directory_for(i, spec))
+        os.makedirs(directory, exist_ok=True)
+        if rng.random() < spec.binary_ratio:
+            path = os.path.join(directory, f"blob_{i}.bin")
+            data = bytes(rng.getrandbits(8) for _ in range(spec.lines * 40))
+            with open(path, "wb") as file:
+                file.write(data)
+            tree.binary_files.append(path)
+        else:
+            path = os.path.join(directory, f"module_{i}.py")
+            data = make_source(rng, spec.lines, spec.tag_density, i, tree.labels).encode()
+            with open(path, "wb") as file:
+                file.write(data)
+            tree.text_files.append(path)
+        tree.bytes += len(data)
+    return tree
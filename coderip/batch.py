@@ -0,0 +1,350 @@
+"""Headless batch mode: runs a file of edit jobs without user interaction.
+
+Jobs are read from JSONL (one object per line) or YAML (a list of objects):
+
+    {"id": "fix-parse", "tags": ["parser"], "instruction": "Fix the off-by-one", "model": "gpt-4"}
+    {"id": "docs", "ranges": ["coderip/edits.py:1-20"], "instruction": "Tighten the docstring"}
+
+`tags` name tagged sections and `ranges` name 1-indexed, inclusive line ranges
+(relative to the source directory). Each job goes through the same pipeline as
+the interactive interface (sections -> conversation -> model -> parse -> apply)
+with at most `--concurrency` jobs in flight. For every job, the conversation,
+the diff and a `result.json` are written to `<output>/<job id>/`.
+
+Files are only modified with `--apply`; otherwise the diffs are left for
+review. Finished jobs are appended to `<output>/progress.jsonl`, and running
+the same jobs with the same output directory again skips them, so an
+interrupted run resumes where it stopped (failed and conflicting jobs are
+retried). A throughput report (jobs/min, tokens/min) is printed and saved to
+`<output>/report.json`.
+
+Usage:
+
+```
+    $ poetry run python -m coderip.batch jobs.jsonl my/project_path [--output out] [--concurrency 4] [--apply]
+```
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from coderip import config
+from coderip.conversation import Conversation
+from coderip.depgraph import DependencyIndex
+from coderip.edits import Edit, EditConflict, apply_to_files, split_lines, unified_diff
+from coderip.main import TagFinder, get_related_context
+from coderip.parser import parse_response
+from coderip.providers import PROVIDERS, ModelError, Provider, estimate_tokens, get_default_provider
+
+RANGE_PATTERN = re.compile(r'^(.+):(\d+)(?:-(\d+))?$')
+# Jobs with these statuses are not run again when resuming
+DONE_STATUSES = ("applied", "proposed", "unchanged")
+
+
+@dataclass
+class Job:
+    id: str
+    instruction: str
+    tags: List[str] = field(default_factory=list)
+    # "path:start-end", 1-indexed and inclusive
+    ranges: List[str] = field(default_factory=list)
+    model: Optional[str] = None
+
+
+@dataclass
+class JobResult:
+    id: str
+    # applied, proposed (not applied), unchanged, conflict or failed
+    status: str
+    error: Optional[str] = None
+    files: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency: float = 0.0
+
+
+@dataclass
+class BatchReport:
+    jobs: int
+    skipped: int
+    elapsed: float
+    statuses: Dict[str, int]
+    prompt_tokens: int
+    completion_tokens: int
+
+    @property
+    def jobs_per_minute(self) -> float:
+        return self.jobs / self.elapsed * 60 if self.elapsed else 0.0
+
+    @property
+    def tokens_per_minute(self) -> float:
+        return (self.prompt_tokens + self.completion_tokens) / self.elapsed * 60 if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "jobs_per_minute": self.jobs_per_minute, "tokens_per_minute": self.tokens_per_minute}
+
+    def summary(self) -> str:
+        statuses = ", ".join(f"{count} {status}" for status, count in sorted(self.statuses.items()))
+        return (
+            f"Ran {self.jobs} job(s) in {self.elapsed:.1f}s ({statuses or 'none'}; {self.skipped} already done)\n"
+            f"Throughput: {self.jobs_per_minute:.1f} jobs/min, {self.tokens_per_minute:.0f} tokens/min "
+            f"({self.prompt_tokens} prompt + {self.completion_tokens} completion tokens)"
+        )
+
+
+def parse_range(spec: str) -> Tuple[str, int, int]:
+    """Parses "path:start-end" (or "path:line") into (path, start, end), 1-indexed."""
+    match = RANGE_PATTERN.match(spec)
+    if not match:
+        raise ValueError(f"Invalid range {spec!r}, expected path:start-end")
+    start = int(match.group(2))
+    end = int(match.group(3) or start)
+    if start < 1 or end < start:
+        raise ValueError(f"Invalid range {spec!r}")
+    return match.group(1), start, end
+
+
+def _make_job(data: dict, position: int) -> Job:
+    if not isinstance(data, dict):
+        raise ValueError(f"Job {position} is not an object: {data!r}")
+    known = {f.name for f in fields(Job)}
+    unknown = set(data) - known
+    if unknown:
+        raise ValueError(f"Job {position} has unknown field(s) {sorted(unknown)}")
+    if not data.get("instruction"):
+        raise ValueError(f"Job {position} has no instruction")
+    data = {"id": f"job-{position}", **data}
+    if isinstance(data.get("tags"), str):
+        data["tags"] = [tag.strip() for tag in data["tags"].split(",")]
+    if isinstance(data.get("ranges"), str):
+        data["ranges"] = [data["ranges"]]
+    job = Job(**data)
+    job.id = str(job.id)
+    if not job.tags and not job.ranges:
+        raise ValueError(f"Job {job.id} has neither tags nor ranges")
+    for spec in job.ranges:
+        parse_range(spec)
+    return job
+
+
+def load_jobs(path: str) -> List[Job]:
+    """Reads jobs from a JSONL or (with PyYAML installed) YAML file."""
+    with open(path) as file:
+        text = file.read()
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML job files require PyYAML (`poetry install -E yaml`)")
+        items = yaml.safe_load(text) or []
+        if isinstance(items, dict):
+            items = items.get("jobs", [])
+    else:
+        items = [
+            json.loads(line) for line in text.splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+    jobs = [_make_job(item, position) for position, item in enumerate(items, 1)]
+    ids = Counter(job.id for job in jobs)
+    duplicates = [job_id for job_id, count in ids.items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate job id(s) {duplicates}")
+    return jobs
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        tag_finder: TagFinder,
+        source_dir: str,
+        output_dir: str = config.BATCH_DIR,
+        provider: Optional[Provider] = None,
+        concurrency: int = config.BATCH_CONCURRENCY,
+        apply: bool = False,
+    ):
+        self.tag_finder = tag_finder
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.provider = provider or get_default_provider()
+        self.concurrency = concurrency
+        self.apply = apply
+        self.progress_path = os.path.join(output_dir, "progress.jsonl")
+        self.progress_lock = threading.Lock()
+        # Serializes reading, editing and re-indexing source files
+        self.apply_lock = threading.Lock()
+
+    def completed(self) -> Dict[str, dict]:
+        """Returns the last recorded result of each finished job."""
+        results = {}
+        if not os.path.exists(self.progress_path):
+            return results
+        with open(self.progress_path) as file:
+            for line in file:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Interrupted while writing the last line
+                    continue
+                results[result["id"]] = result
+        return {job_id: result for job_id, result in results.items() if result["status"] in DONE_STATUSES}
+
+    def run(self, jobs: List[Job]) -> BatchReport:
+        os.makedirs(self.output_dir, exist_ok=True)
+        completed = self.completed()
+        pending = [job for job in jobs if job.id not in completed]
+        logger.info(f"Running {len(pending)} job(s), {len(jobs) - len(pending)} already done")
+
+        statuses: Counter = Counter()
+        prompt_tokens = completion_tokens = 0
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self.run_job, job) for job in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                self._record(result)
+                statuses[result.status] += 1
+                prompt_tokens += result.prompt_tokens
+                completion_tokens += result.completion_tokens
+                print(f"[{done}/{len(pending)}] {result.id}: {result.status}" + (f" ({result.error})" if result.error else ""))
+
+        report = BatchReport(
+            jobs=len(pending),
+            skipped=len(jobs) - len(pending),
+            elapsed=time.perf_counter() - start_time,
+            statuses=dict(statuses),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+        with open(os.path.join(self.output_dir, "report.json"), "w") as file:
+            json.dump(report.to_dict(), file, indent=2)
+        return report
+
+    def _record(self, result: JobResult):
+        with self.progress_lock, open(self.progress_path, "a") as file:
+            file.write(json.dumps(asdict(result)) + "\n")
+
+    def _targets(self, job: Job) -> Dict[str, Edit]:
+        """Returns label -> edit template (with the current code as `original`)."""
+        targets = {}
+        for tag in job.tags:
+            match = self.tag_finder.find_section(tag)
+            if match is None:
+                raise ValueError(f"No section found for tag {tag}")
+            file, _ = match
+            code = self.tag_finder.get_code_by_label(tag, numbered=False)
+            targets[tag] = Edit(path=file.path, code="", label=tag, original=code)
+        for i, spec in enumerate(job.ranges, 1):
+            path, start, end = parse_range(spec)
+            path = os.path.join(self.source_dir, path)
+            with open(path, encoding="utf-8", newline="") as file:
+                lines = split_lines(file.read())
+            if end > len(lines):
+                raise ValueError(f"Range {spec} is past the end of the file ({len(lines)} lines)")
+            # Ranges are sent as sections with generated labels
+            targets[f"range_{i}"] = Edit(
+                path=path, code="", start=start - 1, end=end, original="".join(lines[start - 1:end]),
+            )
+        return targets
+
+    def run_job(self, job: Job) -> JobResult:
+        start_time = time.perf_counter()
+        result = JobResult(id=job.id, status="failed")
+        # Job ids name files, so may not contain path separators
+        safe_id = re.sub(r'[^\w.-]', '_', job.id)
+        job_dir = os.path.join(self.output_dir, safe_id)
+        os.makedirs(job_dir, exist_ok=True)
+        try:
+            with self.apply_lock:
+                targets = self._targets(job)
+            conversation = Conversation(f"batch-{safe_id}", directory=job_dir)
+            conversation.add_user_turn(
+                job.instruction,
+                {label: edit.original for label, edit in targets.items()},
+                related=get_related_context(self.tag_finder, job.tags),
+            )
+            messages = conversation.messages()
+            response = self.provider.complete(messages, model=job.model, session=conversation.session_id)
+            conversation.add_assistant_turn(response.content)
+            conversation.save()
+            result.prompt_tokens = response.prompt_tokens or sum(estimate_tokens(m["content"]) for m in messages)
+            result.completion_tokens = response.completion_tokens or estimate_tokens(response.content)
+
+            parsed_response = parse_response(response.content, labels=list(targets))
+            result.issues = parsed_response.issues
+            result.missing = parsed_response.missing(list(targets))
+            edits = [
+                Edit(**{**asdict(targets[label]), "code": code})
+                for label, code in parsed_response.sections.items() if label in targets
+            ]
+            if not edits:
+                # Not "unchanged", so that resuming runs the job again
+                raise ValueError(f"No sections in the response for {', '.join(result.missing)}")
+            with self.apply_lock:
+                changes = apply_to_files(edits, write=self.apply)
+                if self.apply:
+                    for path in changes:
+                        self.tag_finder.update_tags(path)
+
+            diff = "".join(
+                unified_diff(os.path.relpath(path, self.source_dir), old, new)
+                for path, (old, new) in changes.items()
+            )
+            with open(os.path.join(job_dir, "changes.diff"), "w") as file:
+                file.write(diff)
+            result.files = [os.path.relpath(path, self.source_dir) for path in changes]
+            result.status = "unchanged" if not changes else "applied" if self.apply else "proposed"
+        except EditConflict as e:
+            result.status, result.error = "conflict", str(e)
+        except (ModelError, ValueError, OSError) as e:
+            result.error = str(e)
+        if result.error:
+            logger.warning(f"Job {job.id} {result.status}: {result.error}")
+        result.latency = time.perf_counter() - start_time
+        with open(os.path.join(job_dir, "result.json"), "w") as file:
+            json.dump(asdict(result), file, indent=2)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('jobs', type=str, help='JSONL or YAML file of jobs')
+    parser.add_argument('source_dir', type=str, help='Path to the source directory')
+    parser.add_argument('--output', type=str, default=config.BATCH_DIR, help='Directory for results and progress')
+    parser.add_argument('--concurrency', type=int, default=config.BATCH_CONCURRENCY, help='Jobs in flight at once')
+    parser.add_argument('--apply', action='store_true', help='Write the edits to the source files')
+    parser.add_argument('--provider', type=str, default=config.MODEL_PROVIDER,
+                        help=f'Model provider ({", ".join(sorted(PROVIDERS))}), or a comma-separated failover list')
+    args = parser.parse_args()
+
+    config.MODEL_PROVIDER = args.provider
+    if not os.path.isdir(args.source_dir):
+        raise ValueError(f"The provided path '{args.source_dir}' is not a directory.")
+
+    jobs = load_jobs(args.jobs)
+    dependency_index = DependencyIndex.load() if config.RELATED_CONTEXT_TOKENS > 0 else None
+    tag_finder = TagFinder(display=False, dependency_index=dependency_index)
+    tag_finder.scan_directory(args.source_dir)
+    tag_finder.backfill_completed.wait()
+
+    runner = BatchRunner(tag_finder, args.source_dir, args.output, concurrency=args.concurrency, apply=args.apply)
+    report = runner.run(jobs)
+    print(report.summary())
+    if report.statuses.get("failed") or report.statuses.get("conflict"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
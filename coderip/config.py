@@ -5,3 +5,35 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SYSTEM_MESSAGE = "We are CodeRip, the tool of choice for 100x engineers."
+
+# "openai" or "local" (any OpenAI-compatible server, e.g. llama.cpp or ollama),
+# or a comma-separated list (e.g. "openai,local") to fail over in that order
+MODEL_PROVIDER = os.getenv("CODERIP_PROVIDER", "openai")
+OPENAI_MODEL = os.getenv("CODERIP_OPENAI_MODEL", "gpt-4-1106-preview")
+LOCAL_MODEL_URL = os.getenv("CODERIP_LOCAL_URL", "http://localhost:8080/v1")
+LOCAL_MODEL = os.getenv("CODERIP_LOCAL_MODEL", "local")
+LOCAL_MODEL_SLOTS = int(os.getenv("CODERIP_LOCAL_SLOTS", "1"))
+# Send a duplicate request to the next provider after this many seconds (0 disables)
+HEDGE_AFTER = float(os.getenv("CODERIP_HEDGE_AFTER", "0")) or None
+
+# Token budget for a conversation's history before old turns are summarized
+CONTEXT_TOKENS = int(os.getenv("CODERIP_CONTEXT_TOKENS", "16000"))
+SESSIONS_DIR = os.getenv("CODERIP_SESSIONS_DIR", os.path.join(".coderip", "sessions"))
+
+# Token budget for definitions related to the selected sections (0 disables)
+RELATED_CONTEXT_TOKENS = int(os.getenv("CODERIP_RELATED_TOKENS", "2000"))
+DEPENDENCY_INDEX_PATH = os.getenv("CODERIP_DEPENDENCY_INDEX", os.path.join(".coderip", "depindex.json"))
+
+# Tracked files touched within this window are part of the git working set
+WORKING_SET_RECENT_SECONDS = float(os.getenv("CODERIP_WORKING_SET_RECENT_SECONDS", str(7 * 24 * 3600)))
+
+# Headless batch mode (`python -m coderip.batch`)
+BATCH_DIR = os.getenv("CODERIP_BATCH_DIR", os.path.join(".coderip", "batch"))
+BATCH_CONCURRENCY = int(os.getenv("CODERIP_BATCH_CONCURRENCY", "4"))
+
+# Verification of candidate edits (`--test-command`)
+# "worktree" (git worktrees, the default) or "hardlink" (hardlinked copies)
+VERIFY_ISOLATION = os.getenv("CODERIP_VERIFY_ISOLATION", "worktree")
+VERIFY_PARALLEL = int(os.getenv("CODERIP_VERIFY_PARALLEL", "4"))
+VERIFY_TIMEOUT = float(os.getenv("CODERIP_VERIFY_TIMEOUT", "600")) or None
+VERIFY_DIR = os.getenv("CODERIP_VERIFY_DIR", os.path.join(".coderip", "verify"))
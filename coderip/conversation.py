@@ -0,0 +1,245 @@
+"""Per-session conversation history with incremental code context.
+
+A `Conversation` keeps the dialog as structured turns. Code sections (and
+related definitions) are only sent when they changed since they were last
+sent, so a follow-up costs the tokens of the feedback plus the edited sections
+rather than the whole prompt.
+Turns are appended, which keeps the prompt prefix stable for servers that
+cache it (see `LocalProvider`). When the history exceeds the token budget,
+the oldest turns are replaced by a one-line-per-turn summary, and sections
+whose latest version was dropped are sent again on the next turn.
+
+Sessions are saved as JSON so that they can be resumed.
+"""
+
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+
+from loguru import logger
+
+from coderip import config
+from coderip.depgraph import format_related
+from coderip.parser import parse_response
+from coderip.providers import Messages, estimate_tokens
+
+MAX_SUMMARY_LINES = 20
+
+
+@dataclass
+class Turn:
+    role: str
+    content: str
+    # label -> hash of the code included in this turn
+    sections: Dict[str, str] = field(default_factory=dict)
+    # key -> hash of the related definitions included in this turn
+    related: Dict[str, str] = field(default_factory=dict)
+    tokens: int = 0
+    # The user's request without the code context, for summaries
+    request: str = ""
+
+
+def section_hash(code: str) -> str:
+    return hashlib.sha1(code.encode()).hexdigest()
+
+
+def format_sections(sections: Dict[str, str]) -> str:
+    return "\n".join(f"#|open:{tag}>\n{code}\n#|close:{tag}" for tag, code in sections.items())
+
+
+def _summarize_turn(turn: Turn) -> str:
+    if turn.role == "assistant":
+        labels = list(parse_response(turn.content).sections)
+        if labels:
+            return f"Assistant: returned code for {', '.join(labels)}"
+    text = (turn.request or turn.content).strip()
+    first_line = text.splitlines()[0] if text else ""
+    if len(first_line) > 200:
+        first_line = first_line[:200] + "..."
+    return f"{turn.role.capitalize()}: {first_line}"
+
+
+class Conversation:
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        system_message: str = config.SYSTEM_MESSAGE,
+        max_tokens: int = config.CONTEXT_TOKENS,
+        directory: str = config.SESSIONS_DIR,
+    ):
+        self.session_id = session_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.system_message = system_message
+        self.max_tokens = max_tokens
+        self.directory = directory
+        self.turns: List[Turn] = []
+        self.summary: List[str] = []
+        # label -> hash of the latest version of each section in the context
+        self.sent_sections: Dict[str, str] = {}
+        # key -> hash of the latest version of each related definition in the context
+        self.sent_related: Dict[str, str] = {}
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.session_id}.json")
+
+    def add_user_turn(
+        self,
+        request: str,
+        sections: Optional[Dict[str, str]] = None,
+        related: Optional[Dict[str, str]] = None,
+    ) -> Turn:
+        """Adds a user turn, including only sections that changed since last sent.
+
+        `related` (key -> text, see `depgraph.related_blocks`) are definitions
+        included for reference before the request, also only when they changed.
+        """
+        sections = sections or {}
+        related = related or {}
+        while True:
+            turn = self._user_turn(request, sections, related)
+            self.turns.append(turn)
+            previously_sent = dict(self.sent_sections)
+            previously_related = dict(self.sent_related)
+            self.sent_sections.update(turn.sections)
+            self.sent_related.update(turn.related)
+            self.trim()
+            dropped = [
+                label for label in sections
+                if label not in turn.sections and label not in self.sent_sections
+            ]
+            dropped_related = [
+                key for key in related
+                if key not in turn.related and key not in self.sent_related
+            ]
+            if not dropped and not dropped_related:
+                break
+            # Trimming removed sections this turn relied on; include them instead
+            self.turns.pop()
+            self.sent_sections = {
+                label: digest for label, digest in previously_sent.items()
+                if label not in dropped and label in self.sent_sections
+            }
+            self.sent_related = {
+                key: digest for key, digest in previously_related.items()
+                if key not in dropped_related and key in self.sent_related
+            }
+        logger.info(
+            f"Added user turn {self.session_id=} {turn.tokens=} "
+            f"sections={list(turn.sections)} related={len(turn.related)}"
+        )
+        return turn
+
+    def _user_turn(self, request: str, sections: Dict[str, str], related: Dict[str, str]) -> Turn:
+        changed = {
+            label: code for label, code in sections.items()
+            if self.sent_sections.get(label) != section_hash(code)
+        }
+        unchanged = [label for label in sections if label not in changed]
+        changed_related = {
+            key: text for key, text in related.items()
+            if self.sent_related.get(key) != section_hash(text)
+        }
+
+        parts = []
+        if changed:
+            heading = (
+                "Please modify the following code sections as needed:"
+                if not self.turns and not self.summary else
+                "Here are the latest versions of the code sections that changed:"
+            )
+            parts.append(f"{heading}\n```\n{format_sections(changed)}\n```")
+        if unchanged:
+            parts.append(f"(Unchanged since sent above: {', '.join(unchanged)}.)")
+        if changed_related:
+            parts.append(format_related(changed_related))
+        parts.append(request)
+        content = "\n".join(parts)
+
+        return Turn(
+            role="user",
+            content=content,
+            sections={label: section_hash(code) for label, code in changed.items()},
+            related={key: section_hash(text) for key, text in changed_related.items()},
+            tokens=estimate_tokens(content),
+            request=request,
+        )
+
+    def add_assistant_turn(self, content: str) -> Turn:
+        turn = Turn(role="assistant", content=content, tokens=estimate_tokens(content))
+        self.turns.append(turn)
+        self.trim()
+        return turn
+
+    def messages(self) -> Messages:
+        messages = [{"role": "system", "content": self.system_message}]
+        if self.summary:
+            summary = "\n".join(f"- {line}" for line in self.summary)
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        messages += [{"role": turn.role, "content": turn.content} for turn in self.turns]
+        return messages
+
+    def prompt_tokens(self) -> int:
+        return sum(estimate_tokens(message["content"]) for message in self.messages())
+
+    def trim(self):
+        """Summarizes the oldest turns until the history fits the budget.
+
+        The latest turn is always kept.
+        """
+        while len(self.turns) > 1 and self.prompt_tokens() > self.max_tokens:
+            turn = self.turns.pop(0)
+            self.summary.append(_summarize_turn(turn))
+            self.summary = self.summary[-MAX_SUMMARY_LINES:]
+            # Sections whose latest version just left the context must be resent
+            for label, digest in turn.sections.items():
+                if self.sent_sections.get(label) == digest:
+                    del self.sent_sections[label]
+            for key, digest in turn.related.items():
+                if self.sent_related.get(key) == digest:
+                    del self.sent_related[key]
+            logger.info(f"Trimmed turn from {self.session_id=} {turn.role=} {turn.tokens=}")
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = {
+            "session_id": self.session_id,
+            "system_message": self.system_message,
+            "max_tokens": self.max_tokens,
+            "summary": self.summary,
+            "sent_sections": self.sent_sections,
+            "sent_related": self.sent_related,
+            "turns": [asdict(turn) for turn in self.turns],
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Saved conversation {self.path=}")
+
+    @classmethod
+    def load(cls, session_id: str, directory: str = config.SESSIONS_DIR) -> "Conversation":
+        with open(os.path.join(directory, f"{session_id}.json")) as file:
+            data = json.load(file)
+        conversation = cls(
+            session_id=data["session_id"],
+            system_message=data["system_message"],
+            max_tokens=data["max_tokens"],
+            directory=directory,
+        )
+        conversation.summary = data["summary"]
+        conversation.sent_sections = data["sent_sections"]
+        # Sessions saved before related definitions were tracked have none
+        conversation.sent_related = data.get("sent_related", {})
+        conversation.turns = [Turn(**turn) for turn in data["turns"]]
+        logger.info(f"Resumed conversation {session_id=} turns={len(conversation.turns)}")
+        return conversation
+
+    @classmethod
+    def open(cls, session_id: Optional[str] = None, directory: str = config.SESSIONS_DIR) -> "Conversation":
+        """Resumes `session_id` if it was saved before, else starts it."""
+        if session_id and os.path.exists(os.path.join(directory, f"{session_id}.json")):
+            return cls.load(session_id, directory)
+        return cls(session_id=session_id, directory=directory)
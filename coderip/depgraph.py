@@ -0,0 +1,432 @@
+"""Static index of Python definitions and references, for related context.
+
+For every Python file, the index records the functions, classes, methods and
+module-level variables it defines (with line ranges and signatures) and the
+names it references (with line numbers), using the `ast` module. Given the
+line ranges of the selected sections, `DependencyIndex.related` finds the
+definitions those sections use (callees) and the definitions that use what
+the sections define (callers), and fits them into a token budget: signatures
+first, then full bodies while the budget allows.
+
+Names are resolved by name only, without following imports, so names that
+are defined in many places (e.g. `__init__` or `get`) are skipped as too
+ambiguous to be useful.
+
+The index is updated one file at a time (from `TagFinder.update_tags`) and is
+cached on disk as JSON, keyed by each file's size and mtime, so that a restart
+only re-parses the files that changed.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import ast
+import json
+import os
+import sys
+import threading
+
+from loguru import logger
+
+from coderip import config
+from coderip.providers import estimate_tokens
+
+CACHE_VERSION = 1
+# Names defined more often than this are too ambiguous to resolve
+MAX_DEFINITIONS_PER_NAME = 5
+MAX_VARIABLE_SIGNATURE_CHARS = 200
+SAVE_DELAY = 5.0
+
+# (path, first line, last line) of a selected section, 1-indexed and inclusive
+Selection = Tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class Definition:
+    path: str
+    qualname: str
+    kind: str  # "function", "class" or "variable"
+    start: int  # 1-indexed, inclusive, including decorators
+    end: int
+    signature: str
+
+    @property
+    def name(self) -> str:
+        return self.qualname.rsplit(".", 1)[-1]
+
+
+@dataclass
+class FileSymbols:
+    size: int
+    mtime: float
+    # Sorted by start line
+    definitions: List[Definition]
+    # name -> sorted lines where it is referenced
+    references: Dict[str, List[int]]
+
+    def __post_init__(self):
+        self.starts = [definition.start for definition in self.definitions]
+
+
+@dataclass
+class Related:
+    definition: Definition
+    relation: str  # "callee" or "caller"
+    text: str
+    full: bool = False
+
+
+def _function_header(node) -> str:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}:"
+
+
+def _docstring_line(node, indent: str) -> List[str]:
+    docstring = ast.get_docstring(node)
+    if not docstring:
+        return []
+    return [f'{indent}"""{docstring.strip().splitlines()[0]}"""']
+
+
+def signature(node) -> str:
+    """Returns the header and docstring summary of a function or class.
+
+    Classes include the signatures of their methods.
+    """
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in [*node.bases, *node.keywords])
+        lines = [f"class {node.name}({bases}):" if bases else f"class {node.name}:"]
+        lines += _docstring_line(node, "    ")
+        for child in node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                lines.append(f"    {_function_header(child)} ...")
+        if len(lines) == 1:
+            lines.append("    ...")
+        return "\n".join(lines)
+    return "\n".join([_function_header(node), *_docstring_line(node, "    "), "    ..."])
+
+
+def _parameters(args: ast.arguments) -> set:
+    return {arg.arg for arg in [*args.posonlyargs, *args.args, *args.kwonlyargs, args.vararg, args.kwarg] if arg}
+
+
+def parse_symbols(path: str, source: str) -> Tuple[List[Definition], Dict[str, List[int]]]:
+    """Returns the definitions and references of a Python module.
+
+    Names bound in a function (parameters and assignments) are local to it
+    and not counted as references.
+    """
+    tree = ast.parse(source)
+    source_lines = source.splitlines()
+    definitions = []
+    # Attributes of standard library modules (e.g. `os.path`) aren't ours
+    stdlib_modules = set()
+    # (attribute, line, name at the root of the lookup, e.g. `os` for `os.path.join`)
+    attributes = []
+
+    def visit(node, prefix: str, loads: list, stores: set):
+        """Walks `node` in one pass, collecting loads until their scope is known."""
+        for child in ast.iter_child_nodes(node):
+            kind = type(child)
+            if kind is ast.Name:
+                if type(child.ctx) is ast.Load:
+                    loads.append((child.id, child.lineno))
+                else:
+                    stores.add(child.id)
+                continue
+            if kind is ast.Attribute and type(child.ctx) is ast.Load:
+                base = child.value
+                while type(base) is ast.Attribute:
+                    base = base.value
+                attributes.append((child.attr, child.lineno, base.id if type(base) is ast.Name else None))
+            elif kind is ast.FunctionDef or kind is ast.AsyncFunctionDef or kind is ast.ClassDef:
+                qualname = f"{prefix}{child.name}"
+                start = min([child.lineno, *(decorator.lineno for decorator in child.decorator_list)])
+                definitions.append(Definition(
+                    path, qualname, "class" if kind is ast.ClassDef else "function",
+                    start, child.end_lineno, signature(child),
+                ))
+                stores.add(child.name)
+                if kind is not ast.ClassDef:
+                    # A new scope: keep the loads of names it doesn't bind
+                    function_loads, function_stores = [], _parameters(child.args)
+                    visit(child, f"{qualname}.", function_loads, function_stores)
+                    loads += [load for load in function_loads if load[0] not in function_stores]
+                    continue
+                visit(child, f"{qualname}.", loads, stores)
+                continue
+            elif kind is ast.Lambda:
+                lambda_loads, lambda_stores = [], _parameters(child.args)
+                visit(child, prefix, lambda_loads, lambda_stores)
+                loads += [load for load in lambda_loads if load[0] not in lambda_stores]
+                continue
+            elif kind is ast.Import:
+                for alias in child.names:
+                    module = alias.name.split(".")[0]
+                    if module in sys.stdlib_module_names:
+                        stdlib_modules.add(alias.asname or module)
+            elif (kind is ast.Assign or kind is ast.AnnAssign) and node is tree:
+                targets = child.targets if kind is ast.Assign else [child.target]
+                text = "\n".join(source_lines[child.lineno - 1:child.end_lineno])
+                if len(text) > MAX_VARIABLE_SIGNATURE_CHARS:
+                    text = text[:MAX_VARIABLE_SIGNATURE_CHARS] + " ..."
+                for target in targets:
+                    if type(target) is ast.Name:
+                        definitions.append(Definition(path, target.id, "variable", child.lineno, child.end_lineno, text))
+            visit(child, prefix, loads, stores)
+
+    module_loads: list = []
+    visit(tree, "", module_loads, set())
+    definitions.sort(key=lambda definition: definition.start)
+
+    references: Dict[str, List[int]] = {}
+    for name, line in module_loads:
+        references.setdefault(name, []).append(line)
+    for attribute, line, base in attributes:
+        if base not in stdlib_modules:
+            references.setdefault(attribute, []).append(line)
+    for lines in references.values():
+        lines.sort()
+    return definitions, references
+
+
+def _count_in_range(lines: List[int], start: int, end: int) -> int:
+    return bisect_right(lines, end) - bisect_left(lines, start)
+
+
+class DependencyIndex:
+    def __init__(self, cache_path: Optional[str] = config.DEPENDENCY_INDEX_PATH):
+        self.cache_path = cache_path
+        self.files: Dict[str, FileSymbols] = {}
+        # name -> definitions with that (unqualified) name
+        self.definitions_by_name: Dict[str, List[Definition]] = {}
+        # name -> path -> lines referencing it
+        self.references_by_name: Dict[str, Dict[str, List[int]]] = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.save_timer: Optional[threading.Timer] = None
+
+    def update_file(self, path: str):
+        """Re-parses `path` if it changed since it was indexed."""
+        if not path.endswith(".py"):
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove_file(path)
+            return
+        with self.lock:
+            current = self.files.get(path)
+            if current and current.size == stat.st_size and current.mtime == stat.st_mtime:
+                return
+        try:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                source = file.read()
+            definitions, references = parse_symbols(path, source)
+        except (SyntaxError, ValueError, RecursionError) as e:
+            # Often mid-edit; keep what was indexed before
+            logger.debug(f"Could not parse {path=}: {e}")
+            return
+        except OSError as e:
+            logger.warning(f"Could not read {path=}: {e}")
+            return
+        with self.lock:
+            self._replace(path, FileSymbols(stat.st_size, stat.st_mtime, definitions, references))
+        self.schedule_save()
+
+    def remove_file(self, path: str):
+        with self.lock:
+            if path not in self.files:
+                return
+            self._replace(path, None)
+        self.schedule_save()
+
+    def _replace(self, path: str, symbols: Optional[FileSymbols]):
+        previous = self.files.pop(path, None)
+        if previous:
+            for name in {definition.name for definition in previous.definitions}:
+                remaining = [d for d in self.definitions_by_name[name] if d.path != path]
+                if remaining:
+                    self.definitions_by_name[name] = remaining
+                else:
+                    del self.definitions_by_name[name]
+            for name in previous.references:
+                by_path = self.references_by_name[name]
+                del by_path[path]
+                if not by_path:
+                    del self.references_by_name[name]
+        if symbols:
+            self.files[path] = symbols
+            for definition in symbols.definitions:
+                self.definitions_by_name.setdefault(definition.name, []).append(definition)
+            for name, lines in symbols.references.items():
+                self.references_by_name.setdefault(name, {})[path] = lines
+        self.dirty = True
+
+    def _enclosing(self, path: str, line: int) -> Optional[Definition]:
+        """Returns the innermost definition in `path` containing `line`."""
+        symbols = self.files[path]
+        for i in range(bisect_right(symbols.starts, line) - 1, -1, -1):
+            if symbols.definitions[i].end >= line:
+                return symbols.definitions[i]
+        return None
+
+    def _resolve(self, name: str) -> List[Definition]:
+        definitions = self.definitions_by_name.get(name, [])
+        return definitions if len(definitions) <= MAX_DEFINITIONS_PER_NAME else []
+
+    def related(self, selections: List[Selection], budget: int) -> List[Related]:
+        """Returns the callees and callers of `selections` that fit in `budget` tokens.
+
+        Every related definition gets its signature if it fits, most referenced
+        first, and then its full body while the budget allows.
+        """
+        def selected(definition: Definition) -> bool:
+            return any(
+                definition.path == path and definition.start <= end and definition.end >= start
+                for path, start, end in selections
+            )
+
+        with self.lock:
+            # (path, name) -> references from the selections in that file
+            referenced: Counter = Counter()
+            defined = set()
+            for path, start, end in selections:
+                symbols = self.files.get(path)
+                if symbols is None:
+                    continue
+                for name, lines in symbols.references.items():
+                    count = _count_in_range(lines, start, end)
+                    if count:
+                        referenced[path, name] += count
+                defined.update(d for d in symbols.definitions if start <= d.start <= end)
+
+            # A name defined in the referencing file refers to that definition
+            callees: Counter = Counter()
+            for (path, name), count in referenced.items():
+                definitions = self._resolve(name)
+                local = [definition for definition in definitions if definition.path == path]
+                for definition in local or definitions:
+                    if not selected(definition):
+                        callees[definition] += count
+
+            callers: Counter = Counter()
+            for name in {definition.name for definition in defined}:
+                definitions = self._resolve(name)
+                shadowed = {d.path for d in definitions} - {d.path for d in defined if d.name == name}
+                if not definitions:
+                    continue
+                for path, lines in self.references_by_name.get(name, {}).items():
+                    if path in shadowed:
+                        continue
+                    for line in lines:
+                        definition = self._enclosing(path, line)
+                        if definition and not selected(definition) and definition not in callees:
+                            callers[definition] += 1
+
+        ranked = [(d, "callee") for d, _ in callees.most_common()] + [(d, "caller") for d, _ in callers.most_common()]
+        items, used = [], 0
+        for definition, relation in ranked:
+            tokens = estimate_tokens(definition.signature)
+            if used + tokens <= budget:
+                items.append(Related(definition, relation, definition.signature))
+                used += tokens
+
+        sources: Dict[str, List[str]] = {}
+        for item in items:
+            definition = item.definition
+            if definition.path not in sources:
+                try:
+                    with open(definition.path, encoding="utf-8", errors="replace") as file:
+                        sources[definition.path] = file.read().splitlines()
+                except OSError:
+                    sources[definition.path] = []
+            body = "\n".join(sources[definition.path][definition.start - 1:definition.end])
+            extra = estimate_tokens(body) - estimate_tokens(item.text)
+            if body and used + extra <= budget:
+                item.text, item.full = body, True
+                used += extra
+        return items
+
+    def schedule_save(self):
+        """Saves within `SAVE_DELAY` seconds, batching the updates until then."""
+        if not self.cache_path or (self.save_timer and self.save_timer.is_alive()):
+            return
+        self.save_timer = threading.Timer(SAVE_DELAY, self.save)
+        self.save_timer.daemon = True
+        self.save_timer.start()
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {
+                "version": CACHE_VERSION,
+                "files": {
+                    path: {
+                        "size": symbols.size,
+                        "mtime": symbols.mtime,
+                        "definitions": [
+                            [d.qualname, d.kind, d.start, d.end, d.signature] for d in symbols.definitions
+                        ],
+                        "references": symbols.references,
+                    }
+                    for path, symbols in self.files.items()
+                },
+            }
+            self.dirty = False
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.cache_path)
+        logger.debug(f"Saved dependency index {self.cache_path=} files={len(data['files'])}")
+
+    @classmethod
+    def load(cls, cache_path: Optional[str] = config.DEPENDENCY_INDEX_PATH) -> "DependencyIndex":
+        """Loads the cached index, or returns an empty one."""
+        index = cls(cache_path)
+        if not cache_path or not os.path.exists(cache_path):
+            return index
+        try:
+            with open(cache_path) as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable dependency index {cache_path=}: {e}")
+            return index
+        if data.get("version") != CACHE_VERSION:
+            return index
+        with index.lock:
+            for path, entry in data["files"].items():
+                if not os.path.exists(path):
+                    continue
+                definitions = [Definition(path, *fields) for fields in entry["definitions"]]
+                index._replace(path, FileSymbols(entry["size"], entry["mtime"], definitions, entry["references"]))
+            index.dirty = False
+        logger.info(f"Loaded dependency index {cache_path=} files={len(index.files)}")
+        return index
+
+
+def related_blocks(items: List[Related]) -> Dict[str, str]:
+    """Returns "path:qualname" -> text of each related definition.
+
+    Keys and texts are stable while the definitions don't change, so that a
+    `Conversation` only sends them again when they did.
+    """
+    return {
+        f"{item.definition.path}:{item.definition.qualname}":
+            f"# {item.definition.path} {item.definition.qualname} ({item.relation})\n{item.text}"
+        for item in items
+    }
+
+
+def format_related(blocks: Dict[str, str]) -> str:
+    if not blocks:
+        return ""
+    return "Related definitions, for reference only (don't return these):\n```\n" + "\n\n".join(blocks.values()) + "\n```"
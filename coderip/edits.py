@@ -0,0 +1,122 @@
+"""Applies code returned by the model to source files.
+
+An `Edit` replaces either the body of a tagged section (the lines between
+`#|open:label` and `#|close:label`, which are kept) or a range of lines. The
+section is located in the file's current content, so edits stay correct when
+other edits moved it. If the current code no longer matches what was sent to
+the model, the edit is refused with `EditConflict` rather than overwriting
+changes made in the meantime.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import difflib
+import os
+import shutil
+import tempfile
+
+from loguru import logger
+
+from coderip.fileindex import FileIndex
+
+
+class EditConflict(Exception):
+    """Raised when an edit no longer applies cleanly to the current file."""
+
+
+@dataclass
+class Edit:
+    path: str
+    code: str
+    # Either the label of the section to replace...
+    label: Optional[str] = None
+    # ...or the 0-indexed range of lines [start, end) to replace
+    start: Optional[int] = None
+    end: Optional[int] = None
+    # The code that was sent to the model, if known, to detect conflicts
+    original: Optional[str] = None
+
+    def describe(self) -> str:
+        if self.label:
+            return f"{self.path}#{self.label}"
+        return f"{self.path}:{self.start + 1}-{self.end}"
+
+
+def split_lines(text: str) -> List[str]:
+    """Splits on newlines only (unlike `str.splitlines`), keeping them."""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def _resolve(edit: Edit, text: str, lines: List[str]) -> Tuple[int, int]:
+    if edit.label is None:
+        if not 0 <= edit.start <= edit.end <= len(lines):
+            raise EditConflict(f"{edit.describe()} is outside the file ({len(lines)} lines)")
+        return edit.start, edit.end
+    for start, end, label in FileIndex.from_bytes(text.encode()).sections():
+        if label == edit.label:
+            return start, end
+    raise EditConflict(f"Section {edit.label} not found in {edit.path}")
+
+
+def apply_edits(text: str, edits: List[Edit]) -> str:
+    """Returns `text` with `edits` (all to the same file) applied."""
+    lines = split_lines(text)
+    ranges = sorted(((*_resolve(edit, text, lines), edit) for edit in edits), key=lambda item: item[0])
+    for (_, previous_end, previous), (start, _, edit) in zip(ranges, ranges[1:]):
+        if start < previous_end:
+            raise EditConflict(f"{edit.describe()} overlaps {previous.describe()}")
+    for start, end, edit in ranges:
+        if edit.original is not None and "".join(lines[start:end]) != edit.original:
+            raise EditConflict(f"{edit.describe()} changed since it was sent to the model")
+    # Bottom up, so that earlier line numbers stay valid
+    for start, end, edit in reversed(ranges):
+        code = edit.code
+        if code and not code.endswith("\n"):
+            code += "\n"
+        lines[start:end] = split_lines(code)
+    return "".join(lines)
+
+
+def write_atomic(path: str, text: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as file:
+            file.write(text)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def apply_to_files(edits: List[Edit], write: bool = True) -> Dict[str, Tuple[str, str]]:
+    """Applies `edits`, returning path -> (old text, new text) for each changed file.
+
+    Edits to a file are applied together or not at all. With `write=False`
+    nothing is written, e.g. to preview the diff.
+    """
+    by_path: Dict[str, List[Edit]] = {}
+    for edit in edits:
+        by_path.setdefault(edit.path, []).append(edit)
+
+    changes = {}
+    for path, file_edits in by_path.items():
+        with open(path, encoding="utf-8", newline="") as file:
+            old = file.read()
+        new = apply_edits(old, file_edits)
+        if new == old:
+            continue
+        if write:
+            write_atomic(path, new)
+            logger.info(f"Applied {len(file_edits)} edit(s) to {path}")
+        changes[path] = (old, new)
+    return changes
+
+
+def unified_diff(path: str, old: str, new: str) -> str:
+    return "".join(difflib.unified_diff(
+        split_lines(old), split_lines(new), fromfile=f"a/{path}", tofile=f"b/{path}",
+    ))
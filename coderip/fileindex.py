@@ -0,0 +1,343 @@
+"""Memory-mapped tag parsing and section extraction.
+
+A `FileIndex` records the tag events of a file together with a sparse
+line-offset index: the byte offset and line number of a line start roughly
+every `CHECKPOINT_BYTES`. Both are built in one pass over a memory map of the
+file, so even very large files are never loaded into Python strings, and a
+section is extracted by slicing its byte range out of a fresh memory map and
+decoding just that slice. While indexing, pages that have been scanned are
+released from the mapping, which keeps resident memory bounded by the scan
+window rather than the file size.
+
+The index also keeps a CRC of the bytes between consecutive checkpoints. When
+a file changes, `FileIndex.update` finds the chunks that still match at the
+start of the file and, shifted by the change in size, at its end, re-parses
+only the region between them, and shifts the checkpoints and tag events below
+the edit. A one-line edit of a large file therefore costs a checksum pass and
+the parse of a chunk or two instead of a full re-parse.
+"""
+
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import codecs
+import mmap
+import os
+import re
+import zlib
+
+CHECKPOINT_BYTES = 8 * 1024
+SCAN_WINDOW_BYTES = 16 * 1024 * 1024
+SNIFF_BYTES = 8 * 1024
+# Below this size a plain read is cheaper than setting up a memory map
+MMAP_MIN_BYTES = 1024 * 1024
+TAG_PATTERN = re.compile(rb'#\|(open|close)(?::(\w+))?')
+# Tags only count at the start of a line; a literal newline prefix lets the
+# regex engine skip ahead instead of trying every position like `^` would.
+LINE_TAG_PATTERN = re.compile(rb'\n' + TAG_PATTERN.pattern)
+
+
+@dataclass(frozen=True)
+class TagEvent:
+    offset: int
+    line: int  # 0-indexed
+    kind: str  # "open" or "close"
+    label: Optional[str]
+
+
+def _count_newlines(buffer, start: int, end: int) -> int:
+    count = 0
+    while start < end:
+        stop = min(start + CHECKPOINT_BYTES, end)
+        count += buffer[start:stop].count(b'\n')
+        start = stop
+    return count
+
+
+def _release(buffer, start: int, end: int):
+    """Drops scanned pages from the mapping; they stay in the page cache."""
+    if not hasattr(mmap, 'MADV_DONTNEED') or not isinstance(buffer, mmap.mmap):
+        return
+    start -= start % mmap.PAGESIZE
+    buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def is_text(buffer) -> bool:
+    """Whether the start of `buffer` looks like UTF-8 text."""
+    sample = buffer[:SNIFF_BYTES]
+    if b'\0' in sample:
+        return False
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+class FileIndex:
+    def __init__(self, size: int, mtime: float):
+        self.size = size
+        self.mtime = mtime
+        # Byte offset and 0-indexed line number of sparse line starts
+        self.checkpoint_offsets = array('Q', [0])
+        self.checkpoint_lines = array('Q', [0])
+        # CRC of the bytes from each checkpoint to the next (or the end of file)
+        self.chunk_hashes = array('L')
+        self.line_count = 0  # newlines in the file
+        self.events: List[TagEvent] = []
+        # Bytes parsed to produce this index, for logging and benchmarks
+        self.parsed_bytes = 0
+
+    @classmethod
+    def build(cls, path: str) -> Optional["FileIndex"]:
+        """Indexes `path`, returning None for files that aren't text."""
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            index = cls(stat.st_size, stat.st_mtime)
+            if stat.st_size == 0:
+                return index
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                if not is_text(buffer):
+                    return None
+                index._scan(buffer, 0, stat.st_size)
+                index.line_count = index._finish_chunk(buffer, stat.st_size)
+        index.parsed_bytes = stat.st_size
+        return index
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mtime: float = 0.0) -> "FileIndex":
+        """Indexes in-memory content, e.g. a file about to be written."""
+        index = cls(len(data), mtime)
+        if data:
+            index._scan(data, 0, len(data))
+            index.line_count = index._finish_chunk(data, len(data))
+        index.parsed_bytes = len(data)
+        return index
+
+    def update(self, path: str) -> Optional["FileIndex"]:
+        """Returns an index of the current `path`, re-parsing only what changed.
+
+        Returns `self` if the file looks unchanged and None if it is no longer
+        text.
+        """
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_size == self.size and stat.st_mtime == self.mtime:
+                return self
+            if stat.st_size == 0 or self.size == 0:
+                return FileIndex.build(path)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                if not is_text(buffer):
+                    return None
+                index = self._update(buffer, stat.st_size, stat.st_mtime)
+        return index
+
+    def _chunk_end(self, i: int) -> int:
+        return self.checkpoint_offsets[i + 1] if i + 1 < len(self.checkpoint_offsets) else self.size
+
+    def _update(self, buffer, size: int, mtime: float) -> "FileIndex":
+        count = len(self.checkpoint_offsets)
+        delta = size - self.size
+        with memoryview(buffer) as view:
+            # Leading chunks that are unchanged; the last one only counts if it
+            # ends a line, since text appended to it could extend a tag line
+            first = 0
+            while first < count:
+                start, end = self.checkpoint_offsets[first], self._chunk_end(first)
+                if (
+                    end > size
+                    or zlib.crc32(view[start:end]) != self.chunk_hashes[first]
+                    or buffer[end - 1:end] != b'\n'
+                ):
+                    break
+                first += 1
+            if first == count and delta == 0:
+                # Same content, new mtime
+                index = FileIndex(size, mtime)
+                index.checkpoint_offsets = self.checkpoint_offsets
+                index.checkpoint_lines = self.checkpoint_lines
+                index.chunk_hashes = self.chunk_hashes
+                index.events = self.events
+                index.line_count = self.line_count
+                return index
+            region_start = self.checkpoint_offsets[first] if first < count else self.size
+
+            # Trailing chunks that are unchanged once shifted by `delta` and
+            # still start a line
+            suffix = count
+            while suffix > first:
+                start, end = self.checkpoint_offsets[suffix - 1] + delta, self._chunk_end(suffix - 1) + delta
+                if (
+                    start < region_start
+                    or zlib.crc32(view[start:end]) != self.chunk_hashes[suffix - 1]
+                    or (start > 0 and buffer[start - 1:start] != b'\n')
+                ):
+                    break
+                suffix -= 1
+        old_region_end = self.checkpoint_offsets[suffix] if suffix < count else self.size
+        region_end = old_region_end + delta
+
+        index = FileIndex(size, mtime)
+        index.checkpoint_offsets = self.checkpoint_offsets[:first + 1]
+        index.checkpoint_lines = self.checkpoint_lines[:first + 1]
+        index.chunk_hashes = self.chunk_hashes[:first]
+        if first == count:
+            # Appending after the last chunk, which ends a line
+            index.checkpoint_offsets.append(self.size)
+            index.checkpoint_lines.append(self.line_count)
+        index.events = [event for event in self.events if event.offset < region_start]
+        index._scan(buffer, region_start, region_end)
+        region_end_line = index._finish_chunk(buffer, region_end)
+        index.parsed_bytes = region_end - region_start
+
+        if suffix == count:
+            if index.checkpoint_offsets[-1] == size:
+                # Truncated at a checkpoint; its chunk hash already ends at the file end
+                index.checkpoint_offsets.pop()
+                index.checkpoint_lines.pop()
+            index.line_count = region_end_line
+            return index
+        old_region_end_line = self.checkpoint_lines[suffix]
+        line_delta = region_end_line - old_region_end_line
+        if index.checkpoint_offsets[-1] == region_end:
+            # The edit removed whole chunks; the suffix starts at the last checkpoint
+            suffix_offsets = self.checkpoint_offsets[suffix + 1:]
+            suffix_lines = self.checkpoint_lines[suffix + 1:]
+        else:
+            suffix_offsets = self.checkpoint_offsets[suffix:]
+            suffix_lines = self.checkpoint_lines[suffix:]
+        index.checkpoint_offsets.extend(offset + delta for offset in suffix_offsets)
+        index.checkpoint_lines.extend(line + line_delta for line in suffix_lines)
+        index.chunk_hashes.extend(self.chunk_hashes[suffix:])
+        index.events += [
+            TagEvent(event.offset + delta, event.line + line_delta, event.kind, event.label)
+            for event in self.events if event.offset >= old_region_end
+        ]
+        index.line_count = self.line_count + line_delta
+        return index
+
+    def _finish_chunk(self, buffer, end: int) -> int:
+        """Hashes the chunk from the last checkpoint to `end`, returning the line at `end`."""
+        start = self.checkpoint_offsets[-1]
+        if end <= start:
+            return self.checkpoint_lines[-1]
+        chunk = buffer[start:end]
+        self.chunk_hashes.append(zlib.crc32(chunk))
+        return self.checkpoint_lines[-1] + chunk.count(b'\n')
+
+    def _scan(self, buffer, start: int, end: int):
+        """Adds checkpoints and tag events for [start, end), one window at a time.
+
+        `start` must be a line start at or after the last checkpoint.
+        """
+        while start < end:
+            window_end = min(start + SCAN_WINDOW_BYTES, end)
+            if window_end < end:
+                # Windows end on a line boundary so that no tag straddles two
+                newline = buffer.find(b'\n', window_end, end)
+                window_end = end if newline == -1 else newline + 1
+            self._add_checkpoints(buffer, self.checkpoint_offsets[-1], self.checkpoint_lines[-1], window_end)
+            self.events += self._scan_events(buffer, start, window_end)
+            _release(buffer, start, window_end)
+            start = window_end
+
+    def _add_checkpoints(self, buffer, offset: int, line: int, end: int):
+        """Appends checkpoints for line starts in (offset, end]."""
+        while True:
+            target = offset + CHECKPOINT_BYTES
+            if target >= end:
+                return
+            newline = buffer.find(b'\n', target, end)
+            if newline == -1 or newline + 1 >= end:
+                return
+            chunk = buffer[offset:newline + 1]
+            self.chunk_hashes.append(zlib.crc32(chunk))
+            line += chunk.count(b'\n')
+            offset = newline + 1
+            self.checkpoint_offsets.append(offset)
+            self.checkpoint_lines.append(line)
+
+    def line_of(self, buffer, offset: int) -> int:
+        """Returns the 0-indexed line containing byte `offset`."""
+        i = bisect_right(self.checkpoint_offsets, offset) - 1
+        start = self.checkpoint_offsets[i]
+        return self.checkpoint_lines[i] + _count_newlines(buffer, start, offset)
+
+    def offset_of(self, buffer, line: int) -> int:
+        """Returns the byte offset where 0-indexed `line` starts (or the file size)."""
+        i = bisect_right(self.checkpoint_lines, line) - 1
+        offset = self.checkpoint_offsets[i]
+        for _ in range(line - self.checkpoint_lines[i]):
+            newline = buffer.find(b'\n', offset)
+            if newline == -1:
+                return self.size
+            offset = newline + 1
+        return offset
+
+    def _scan_events(self, buffer, start: int, end: int) -> List[TagEvent]:
+        """Returns tag events in [start, end); `start` must be a line start."""
+        matches = []
+        if start == 0:
+            match = TAG_PATTERN.match(buffer, 0, end)
+            if match:
+                matches.append((0, match))
+        matches += [
+            (match.start() + 1, match)
+            for match in LINE_TAG_PATTERN.finditer(buffer, max(start - 1, 0), end)
+        ]
+
+        events = []
+        line, position = None, start
+        for offset, match in matches:
+            # Count lines incrementally from the previous event
+            if line is None:
+                line = self.line_of(buffer, offset)
+            else:
+                line += _count_newlines(buffer, position, offset)
+            position = offset
+            label = match.group(2).decode('ascii') if match.group(2) else None
+            events.append(TagEvent(offset, line, match.group(1).decode('ascii'), label))
+        return events
+
+    def sections(self) -> List[Tuple[int, int, str]]:
+        """Matches tag events into (start_line, end_line, label) sections.
+
+        Line numbers follow `CodeSection`: `start_line` is the 1-indexed open tag
+        line and `end_line` the 1-indexed last line before the close tag.
+        """
+        sections = []
+        tag_stack = []
+        for event in self.events:
+            if event.kind == 'open':
+                tag_stack.append((event.line + 1, event.label))  # Line numbers are 1-indexed
+            else:
+                for j in range(len(tag_stack) - 1, -1, -1):  # Iterate backwards
+                    start_line, start_label = tag_stack[j]
+                    if start_label == event.label:
+                        sections.append((start_line, event.line, event.label))
+                        tag_stack.pop(j)
+                        break
+        return sections
+
+    def is_stale(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        return stat.st_size != self.size or stat.st_mtime != self.mtime
+
+    def read_lines(self, path: str, start: int, end: int) -> str:
+        """Returns 0-indexed lines [start, end) of `path`, decoding only those bytes."""
+        if self.size == 0 or end <= start:
+            return ''
+        with open(path, 'rb') as file:
+            if self.size < MMAP_MIN_BYTES:
+                return self._slice_lines(file.read(), start, end)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return self._slice_lines(buffer, start, end)
+
+    def _slice_lines(self, buffer, start: int, end: int) -> str:
+        start_offset = self.offset_of(buffer, start)
+        end_offset = self.offset_of(buffer, end)
+        return buffer[start_offset:end_offset].decode('utf-8', errors='replace')
@@ -0,0 +1,8 @@
+import sys
+
+
+def configure_logging(logger, log_level: str):
+    log_level = log_level.upper()
+    logger.remove()
+    logger.add(sys.stderr, level=log_level)
+    logger.debug(f"{log_level=}")
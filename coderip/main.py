@@ -427,26 +427,29 @@ ideas
 import argparse
 import threading
 from colorama import Fore, Style
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from pprint import pformat
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import os
-import re
 import subprocess
 import psutil
-import openai
 import time
 from loguru import logger
-from openai import OpenAI
 
 from coderip import config, log
+from coderip.conversation import Conversation, format_sections
+from coderip.depgraph import DependencyIndex, related_blocks
+from coderip.edits import Edit, EditConflict, apply_to_files, unified_diff
+from coderip.fileindex import FileIndex
+from coderip.parser import parse_response
+from coderip.providers import ModelError, PROVIDERS, get_default_provider
+from coderip.verify import Verifier
+from coderip.workingset import WorkingSet, get_working_set
 
 log.configure_logging(logger, "INFO")
 
-openai.api_key = config.OPENAI_API_KEY
-
 #|open:types
 @dataclass(frozen=True)
 class File:
@@ -464,24 +467,79 @@ TagData = Dict[File, List[CodeSection]]
 
 #|open:tagfinder
 class TagFinder(FileSystemEventHandler):
-    def __init__(self):
+    def __init__(self, display: bool = True, dependency_index: Optional[DependencyIndex] = None):
         logger.info(f"Initializing TagFinder")
         super().__init__()
+        # Whether to print the available tags after updates
+        self.display = display
+        # Kept up to date with the files, if given
+        self.dependency_index = dependency_index
         self.tag_data: TagData = {}
+        self.file_indexes: Dict[File, FileIndex] = {}
         self.data_lock = threading.Lock()
 
         self.display_tags_timer = threading.Timer(5.0, lambda: None)
         self.display_tags_timer.start()
 
         self.initial_scan_completed = False
+        self.backfill_completed = threading.Event()
+        self.working_set: Optional[WorkingSet] = None
+        self.time_to_interactive: Optional[float] = None
 
     def scan_directory(self, directory_path: str):
-        """Scans the entire directory and updates tags for all files without displaying each update."""
-        for root, _, files in os.walk(directory_path):
+        """Scans the git working set, then backfills the rest of the directory in the background.
+
+        Tags become available (`initial_scan_completed`) as soon as the working set
+        has been scanned. Outside of git, the whole directory is scanned up front.
+        """
+        start_time = time.perf_counter()
+        self.working_set = get_working_set(directory_path)
+        if self.working_set is None:
+            self._scan_remaining(directory_path, set())
+            self.time_to_interactive = time.perf_counter() - start_time
+            self.initial_scan_completed = True
+            self._save_dependency_index()
+            self.backfill_completed.set()
+            logger.info(f"Scanned directory in {self.time_to_interactive:.3f}s")
+            return
+
+        for file_path in self.working_set.paths:
+            self.update_tags(file_path)
+        self.time_to_interactive = time.perf_counter() - start_time
+        self.initial_scan_completed = True
+        logger.info(
+            f"Scanned working set of {len(self.working_set.paths)} files, "
+            f"time to interactive {self.time_to_interactive:.3f}s"
+        )
+
+        def backfill():
+            self._scan_remaining(directory_path, self.working_set.path_set)
+            self._save_dependency_index()
+            self.backfill_completed.set()
+            logger.info(f"Backfill completed in {time.perf_counter() - start_time:.3f}s")
+
+        threading.Thread(target=backfill, daemon=True).start()
+
+    def _save_dependency_index(self):
+        if self.dependency_index:
+            try:
+                self.dependency_index.save()
+            except OSError as e:
+                logger.warning(f"Could not save dependency index: {e}")
+
+    def _scan_remaining(self, directory_path: str, scanned: set):
+        for root, dirs, files in os.walk(directory_path):
+            dirs[:] = [d for d in dirs if d != '.git']
             for file in files:
                 file_path = os.path.join(root, file)
-                self.update_tags(file_path)
-        self.initial_scan_completed = True
+                if os.path.abspath(file_path) not in scanned:
+                    self.update_tags(file_path)
+
+    def _files_by_priority(self) -> List[Tuple[File, List[CodeSection]]]:
+        """Returns (file, sections) pairs, files in the git working set first."""
+        if not self.working_set:
+            return list(self.tag_data.items())
+        return sorted(self.tag_data.items(), key=lambda item: item[0].path not in self.working_set)
 
     def on_modified(self, event):
         logger.debug(f"File modified {event=}")
@@ -495,43 +553,48 @@ class TagFinder(FileSystemEventHandler):
         relative_path = os.path.relpath(file_path)
 
         if not os.path.exists(file_path) or file_path.endswith('.lock') or '.git' in file_path:
+            if self.dependency_index:
+                self.dependency_index.remove_file(relative_path)
             return
 
+        file_key = File(path=relative_path, name=os.path.basename(relative_path))
+        with self.data_lock:
+            previous_index = self.file_indexes.get(file_key)
+
         try:
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-        except UnicodeDecodeError:
+            if previous_index is None:
+                file_index = FileIndex.build(file_path)
+            else:
+                # Only re-parse the region that changed since the last update
+                file_index = previous_index.update(file_path)
+        except OSError as e:
+            logger.warning(f"Could not read {relative_path}: {e}")
+            return
+        if file_index is None:
             logger.warning(f"Skipping non-text file: {relative_path}")
             return
+        if file_index is previous_index:
+            return
 
-        logger.info(f"Updating tags for {relative_path}")
+        logger.info(f"Updating tags for {relative_path} (parsed {file_index.parsed_bytes} of {file_index.size} bytes)")
 
-        file_key = File(path=relative_path, name=os.path.basename(relative_path))
-        sections = []
-        tag_stack = []
-
-        for i, line in enumerate(lines):
-            open_tag_match = re.match(r'#\|open(?:\:(\w+))?', line)
-            close_tag_match = re.match(r'#\|close(?:\:(\w+))?', line)
-
-            if open_tag_match:
-                tag_stack.append((i + 1, open_tag_match.group(1)))  # Line numbers are 1-indexed
-            elif close_tag_match:
-                label = close_tag_match.group(1)
-                for j in range(len(tag_stack) - 1, -1, -1):  # Iterate backwards
-                    start_line, start_label = tag_stack[j]
-                    if start_label == label:
-                        sections.append(CodeSection(start_line, i, label))
-                        tag_stack.pop(j)
-                        break
+        sections = [
+            CodeSection(start_line, end_line, label)
+            for start_line, end_line, label in file_index.sections()
+        ]
 
         with self.data_lock:
             self.tag_data[file_key] = sections
+            self.file_indexes[file_key] = file_index
             logger.debug(f"Updated tag_data for {relative_path}: {sections}")
+        if self.dependency_index:
+            self.dependency_index.update_file(relative_path)
 
         self.schedule_display_tags()
 
     def schedule_display_tags(self):
+        if not self.display:
+            return
         self.display_tags_timer.cancel()
         self.display_tags_timer = threading.Timer(1.0, self.display_tags)
         self.display_tags_timer.start()
@@ -540,7 +603,7 @@ class TagFinder(FileSystemEventHandler):
         with self.data_lock:
             # Building a dictionary grouped by tag
             tag_groups = {}
-            for file, sections in self.tag_data.items():
+            for file, sections in self._files_by_priority():
                 for section in sections:
                     tag = section.label
                     if tag not in tag_groups:
@@ -556,25 +619,52 @@ class TagFinder(FileSystemEventHandler):
                 print(f"\nTag: {Fore.YELLOW}{tag}{Style.RESET_ALL}")
                 for file, start_line, end_line in files:
                     path_display = f"{Fore.BLUE}{file.path}{Style.RESET_ALL}"
+                    if self.working_set and file.path in self.working_set:
+                        path_display += f" {Fore.GREEN}(active){Style.RESET_ALL}"
                     lines_display = f"{Fore.MAGENTA}Lines {start_line}-{end_line}{Style.RESET_ALL}"
                     print(f"  - {path_display}, {lines_display}")
 
-    def get_code_by_label(self, label: str, numbered=True) -> str:
-        """Returns the code for a given label."""
+    def _find_section(self, label: str) -> Optional[Tuple[File, CodeSection]]:
+        return next(
+            (
+                (file, section)
+                for file, sections in self._files_by_priority()
+                for section in sections
+                if section.label == label
+            ),
+            None,
+        )
+
+    def find_section(self, label: str) -> Optional[Tuple[File, CodeSection]]:
+        """Returns the file and section for `label`, preferring the working set."""
         with self.data_lock:
-            for file, sections in self.tag_data.items():
-                for section in sections:
-                    if section.label == label:
-                        with open(file.path, 'r') as file:
-                            lines = file.readlines()
-                            # Extract the lines for this section
-                            code_lines = lines[section.start_line - 1:section.end_line - 1]
-                            if numbered:
-							    code_lines = [
-                                    f"{i+section.start_line}: {line}"
-                                    for i, line in enumerate(code_lines)
-                                ]
-                            return ''.join(code_lines)
+            return self._find_section(label)
+
+    def get_code_by_label(self, label: str, numbered=True) -> str:
+        """Returns the code for a given label.
+
+        Only the section's bytes are read (via mmap), so this is cheap even for
+        very large files.
+        """
+        for attempt in range(2):
+            with self.data_lock:
+                match = self._find_section(label)
+                if match is None:
+                    break
+                file, section = match
+                file_index = self.file_indexes[file]
+            if file_index.is_stale(file.path) and attempt == 0:
+                # Modified since it was indexed and the watcher hasn't caught up
+                self.update_tags(file.path)
+                continue
+            # The lines between the open and close tags (0-indexed)
+            code = file_index.read_lines(file.path, section.start_line, section.end_line)
+            if numbered:
+                code = ''.join(
+                    f"{i + section.start_line + 1}: {line}"
+                    for i, line in enumerate(code.splitlines(keepends=True))
+                )
+            return code
         return f"No code found for label: {label}"
 
 #|close:tagfinder
@@ -623,33 +713,6 @@ def monitor_output(executable_name: str):
     return output_data
 #|close:monitor_output
 
-def get_model_response(prompt: str, model: str = "gpt-4-1106-preview") -> str:
-    logger.info(f"Getting model response {prompt=} {model=}")
-
-    # Create an instance of the OpenAI client
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "YOUR_API_KEY"))
-
-    try:
-        messages = [
-            {"role": "system", "content": config.SYSTEM_MESSAGE},
-            {"role": "user", "content": prompt}
-        ]
-        logger.info(f"messages=\n{pformat(messages)}")
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-        )
-        logger.info(f"response=\n{pformat(response)}")
-        model_response = response.choices[0].message.content
-        logger.info(f"Model response {model_response=}")
-        return model_response
-    except Exception as e:
-        logger.error(f"Error in getting model response: {e}")
-        return "Error: Could not get response from model."
-
-    return model_response
-
-
 def execute_command(command: str):
     logger.info(f"Executing command {command=}")
     result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -657,13 +720,149 @@ def execute_command(command: str):
     logger.info(f"Command output {stdout=} {stderr=}")
     return stdout, stderr
 
-def update_source_files(tag_finder: TagFinder, tags: List[str], modifications: str):
-    # This function needs to parse 'modifications', locate the corresponding sections in the source files,
-    # and replace them with the new code. This can be complex and requires careful implementation.
-    # The complexity arises from the need to accurately map the modifications back to the correct file and line numbers.
-    pass
+def get_edits(
+    tag_finder: TagFinder,
+    tags: List[str],
+    modifications: str,
+    sent_sections: Optional[Dict[str, str]] = None,
+) -> List[Edit]:
+    """Returns an edit for each section of `tags` in the model's `modifications`.
+
+    `sent_sections` (without line numbers) is the code that was sent, so that
+    sections changed on disk in the meantime are not overwritten.
+    """
+    matches = {tag: tag_finder.find_section(tag) for tag in tags}
+    # The number get_code_by_label gave the first line of each section
+    first_lines = {tag: match[1].start_line + 1 for tag, match in matches.items() if match}
+    parsed_response = parse_response(modifications, labels=tags, first_lines=first_lines)
+    edits = []
+    for tag, code in parsed_response.sections.items():
+        # Sections nested in the selected ones, or never sent, aren't edited
+        if tag not in tags:
+            continue
+        match = matches[tag]
+        if match is None:
+            logger.warning(f"No section found for {tag=}")
+            continue
+        file, _ = match
+        original = sent_sections.get(tag) if sent_sections else None
+        edits.append(Edit(path=file.path, code=code, label=tag, original=original))
+    return edits
+
+
+def update_source_files(
+    tag_finder: TagFinder,
+    tags: List[str],
+    modifications: str,
+    sent_sections: Optional[Dict[str, str]] = None,
+) -> Dict[str, str]:
+    """Writes the sections in `modifications` back to their files.
+
+    Returns the diff of each file that changed.
+    """
+    changes = apply_to_files(get_edits(tag_finder, tags, modifications, sent_sections))
+    diffs = {}
+    for path, (old, new) in changes.items():
+        tag_finder.update_tags(path)
+        diffs[path] = unified_diff(path, old, new)
+    return diffs
+
+
+def get_verified_response(
+    tag_finder: TagFinder,
+    conversation: Conversation,
+    tags: List[str],
+    sent_sections: Dict[str, str],
+    verifier: Verifier,
+    candidates: int = 1,
+    model: str = None,
+) -> str:
+    """Asks the model for `candidates` responses and tests them in parallel.
+
+    `tags` are the tags whose sections were sent; a candidate without code for
+    each of them fails. The first response whose edits pass `verifier` is
+    recorded in the conversation (or the first response, if none passed) and
+    returned.
+    """
+    provider = get_default_provider()
+    turn = conversation.turns[-1]
+    # A session pins requests to one server slot, which would run the
+    # candidates one after another
+    sessions = [conversation.session_id] if candidates == 1 else None
+    responses = provider.complete_batch([conversation.messages()] * candidates, model=model, sessions=sessions)
+    print(f"\n(Sent {turn.tokens} new tokens this turn for {candidates} candidate(s))")
+    contents = {f"candidate_{i}": response.content for i, response in enumerate(responses, 1)}
+    edits = {name: get_edits(tag_finder, tags, content, sent_sections) for name, content in contents.items()}
+
+    print(f"Running `{verifier.command}` against {candidates} candidate(s)...")
+    report = verifier.verify(edits, labels=tags)
+    print(report.summary())
+    chosen = report.first_passed
+    if chosen is None:
+        chosen = next(iter(contents))
+        failed = next((result for result in report.results if result.candidate == chosen), None)
+        if failed and failed.tail:
+            print(f"\nOutput of {chosen} (full log: {failed.log_path}):\n{failed.tail}")
+
+    conversation.add_assistant_turn(contents[chosen])
+    conversation.save()
+    return contents[chosen]
+
+def get_conversation_response(conversation: Conversation, model: str = None) -> str:
+    """Sends the conversation to the model and records the reply, raising ModelError on failure."""
+    provider = get_default_provider()
+    turn = conversation.turns[-1]
+    response = provider.complete(conversation.messages(), model=model, session=conversation.session_id)
+    conversation.add_assistant_turn(response.content)
+    conversation.save()
+    logger.info(
+        f"Conversation turn {conversation.session_id=} sent_tokens={turn.tokens} "
+        f"{response.prompt_tokens=} {response.cached_tokens=} {response.latency=:.3f}"
+    )
+    print(
+        f"\n(Sent {turn.tokens} new tokens this turn; "
+        f"{response.prompt_tokens} prompt tokens in total, {response.cached_tokens} cached)"
+    )
+    return response.content
+
+
+def get_related_context(tag_finder: TagFinder, tags: List[str], budget: int = None) -> Dict[str, str]:
+    """Returns the definitions related to the sections of `tags` that fit in `budget` tokens.
+
+    See `related_blocks` for the format.
+    """
+    budget = config.RELATED_CONTEXT_TOKENS if budget is None else budget
+    if not tag_finder.dependency_index or budget <= 0:
+        return {}
+    selections = []
+    for tag in tags:
+        match = tag_finder.find_section(tag)
+        if match:
+            file, section = match
+            # The lines between the open and close tags, 1-indexed
+            selections.append((file.path, section.start_line + 1, section.end_line))
+    related = tag_finder.dependency_index.related(selections, budget)
+    logger.info(f"Related definitions {[(item.definition.qualname, item.full) for item in related]}")
+    return related_blocks(related)
+
+
+def get_sections(tag_finder: TagFinder, tags: List[str]) -> Dict[str, str]:
+    sections = {}
+    for tag in tags:
+        # get_code_by_label returns a message rather than nothing for unknown tags
+        if tag_finder.find_section(tag):
+            sections[tag] = tag_finder.get_code_by_label(tag)
+        else:
+            print(f"No code found for tag: {tag}")
+    return sections
+
 
-def user_interaction_interface(tag_finder: TagFinder):
+def user_interaction_interface(
+    tag_finder: TagFinder,
+    conversation: Conversation,
+    verifier: Optional[Verifier] = None,
+    candidates: int = 1,
+):
     logger.info("Starting user interaction interface")
 
     while not tag_finder.initial_scan_completed:
@@ -682,35 +881,43 @@ def user_interaction_interface(tag_finder: TagFinder):
             continue
 
         tags = [tag.strip() for tag in user_input.split(',')]
-        code_contents = []
-
-        for tag in tags:
-            code_content = tag_finder.get_code_by_label(tag)
-            if code_content:
-                code_contents.append(f"#|open:{tag}>\n{code_content}\n#|close:{tag}")
-            else:
-                print(f"No code found for tag: {tag}")
+        sections = get_sections(tag_finder, tags)
+        sent_sections = {tag: tag_finder.get_code_by_label(tag, numbered=False) for tag in sections}
 
-        if not code_contents:
+        if not sections:
             continue
+        # Unknown tags aren't sent, so no code is expected back for them
+        tags = list(sections)
 
-        # Join the contents from multiple tags with newlines
-        combined_code_content = "\n".join(code_contents)
-        logger.info(f"\n{combined_code_content}")
+        logger.info(f"\n{format_sections(sections)}")
 
         # Ask the user for a specific request or command
         user_request = input("\nWhat do you want to do with these code sections? (e.g. 'find and fix the bug', 'implement logic so that ...'): ")
         logger.info(f"User request {user_request=}")
 
-        prompt = f"""Please modify the following code sections as needed:
-```
-{combined_code_content}
-```
-{user_request}"""
+        # Only sections that changed since they were last sent are included
+        conversation.add_user_turn(user_request, sections, related=get_related_context(tag_finder, tags))
 
-        model_suggested_modifications = get_model_response(prompt)
+        try:
+            if verifier:
+                model_suggested_modifications = get_verified_response(
+                    tag_finder, conversation, tags, sent_sections, verifier, candidates,
+                )
+            else:
+                model_suggested_modifications = get_conversation_response(conversation)
+        except ModelError as e:
+            logger.error(f"Error in getting model response: {e}")
+            print(f"Could not get a response from the model: {e}")
+            continue
         print(f"\nModel suggests the following modifications:\n{model_suggested_modifications}")
 
+        parsed_response = parse_response(model_suggested_modifications, labels=tags)
+        if parsed_response.issues:
+            logger.warning(f"Recovered malformed response {parsed_response.issues=}")
+        missing_tags = parsed_response.missing(tags)
+        if missing_tags:
+            print(f"No code returned for tag(s): {', '.join(missing_tags)}")
+
         """
         confirm = input("Confirm command (yes/no), provide feedback, or type 'exit': ")
         if confirm.lower() == 'yes':
@@ -722,14 +929,27 @@ def user_interaction_interface(tag_finder: TagFinder):
         # Ask for confirmation before updating the source files
         confirm = input("Apply these modifications to the source files? (yes/no): ")
         if confirm.lower() == 'yes':
-            update_source_files(tag_finder, tags, model_suggested_modifications)
-            print("Source files updated with the modifications.")
+            try:
+                diffs = update_source_files(tag_finder, tags, model_suggested_modifications, sent_sections)
+            except (EditConflict, OSError) as e:
+                logger.error(f"Could not apply modifications: {e}")
+                print(f"Could not apply the modifications: {e}")
+                continue
+            for diff in diffs.values():
+                print(diff)
+            print(f"Updated {len(diffs)} source file(s) with the modifications.")
         elif confirm.lower() == 'exit':
             break
         else:
             feedback = input("Please provide your feedback: ")
-            new_prompt = f"{prompt}\nFeedback: {feedback}\nAdjusted command:"
-            new_command = get_model_response(new_prompt)
+            # Sections edited on disk in the meantime are sent again
+            conversation.add_user_turn(f"Feedback: {feedback}", get_sections(tag_finder, tags))
+            try:
+                new_command = get_conversation_response(conversation)
+            except ModelError as e:
+                logger.error(f"Error in getting model response: {e}")
+                print(f"Could not get a response from the model: {e}")
+                continue
             print(f"New command based on feedback: {new_command}")
 
 #|open:main
@@ -738,12 +958,22 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('source_dir', type=str, help='Path to the source directory')
     parser.add_argument('--exec', type=str, help='Executable name for output monitoring', default='')
+    parser.add_argument('--provider', type=str, default=config.MODEL_PROVIDER,
+                        help=f'Model provider ({", ".join(sorted(PROVIDERS))}), or a comma-separated failover list')
+    parser.add_argument('--session', type=str, help='Conversation session to start or resume', default=None)
+    parser.add_argument('--test-command', type=str, default=None,
+                        help='Command that verifies proposed edits (run in an isolated copy, exit code 0 passes)')
+    parser.add_argument('--candidates', type=int, default=1,
+                        help='Responses to request and verify in parallel with --test-command')
     args = parser.parse_args()
 
+    config.MODEL_PROVIDER = args.provider
+
     if not os.path.isdir(args.source_dir):
         raise ValueError(f"The provided path '{args.source_dir}' is not a directory.")
 
-    tag_finder = TagFinder()
+    dependency_index = DependencyIndex.load() if config.RELATED_CONTEXT_TOKENS > 0 else None
+    tag_finder = TagFinder(dependency_index=dependency_index)
     watcher_thread = threading.Thread(target=watch_directory, args=(args.source_dir, tag_finder))
     watcher_thread.start()
 
@@ -751,7 +981,11 @@ def main():
         monitor_thread = threading.Thread(target=monitor_output, args=(args.exec,))
         monitor_thread.start()
 
-    user_interaction_interface(tag_finder)
+    conversation = Conversation.open(args.session)
+    print(f"Session: {conversation.session_id} (resume with --session {conversation.session_id})")
+
+    verifier = Verifier(args.source_dir, args.test_command) if args.test_command else None
+    user_interaction_interface(tag_finder, conversation, verifier, args.candidates)
 #|close:main
 #|close:all
 
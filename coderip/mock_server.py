@@ -0,0 +1,259 @@
+"""Deterministic OpenAI-compatible server for running CodeRip offline.
+
+Implements the subset of llama.cpp's server used by `LocalProvider`:
+`POST /v1/chat/completions`, honouring `cache_prompt` and `id_slot` with a
+per-slot prompt prefix cache. Processing time is simulated from the number of
+uncached prompt tokens, so prefix reuse and batching have a measurable effect.
+
+The response echoes back the tagged sections found in the last user message,
+which is enough to drive the whole prompt -> model -> parse pipeline.
+
+Faults can be injected for exercising failover: `error_rate` fails a
+(seeded, hence reproducible) fraction of requests with HTTP 500,
+`slow_rate`/`slow_latency` delay a fraction of them, and `down` fails every
+request with HTTP 503. All of these may be changed while the server runs.
+
+Usage:
+
+```
+    $ poetry run python -m coderip.mock_server --port 8080
+    $ CODERIP_PROVIDER=local poetry run python coderip/main.py my/project_path
+```
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+from loguru import logger
+
+from coderip.parser import parse_response
+from coderip.providers import estimate_tokens
+
+
+class _Slot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.prompt = ""
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    length = min(len(a), len(b))
+    if a[:length] == b[:length]:
+        return length
+    low, high = 0, length
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def mock_completion(messages: List[dict]) -> str:
+    """Returns the tagged sections of the last user message, unchanged."""
+    prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    sections = parse_response(prompt).sections
+    if not sections:
+        return f"OK ({estimate_tokens(prompt)} tokens received)"
+    blocks = [f"#|open:{label}\n{code}\n#|close:{label}" for label, code in sections.items()]
+    return "```python\n" + "\n".join(blocks) + "\n```"
+
+
+class MockLLMServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        slots: int = 1,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.slots = [_Slot() for _ in range(slots)]
+        self.slot_cursor = 0
+        self.slot_lock = threading.Lock()
+        self.request_count = 0
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.down = False
+        self.random = random.Random(seed)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Mock LLM server listening {self.url=}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _acquire_slot(self, slot_id: Optional[int]) -> _Slot:
+        if slot_id is not None and 0 <= slot_id < len(self.slots):
+            slot = self.slots[slot_id]
+            slot.lock.acquire()
+            return slot
+        with self.slot_lock:
+            start = self.slot_cursor
+            self.slot_cursor = (self.slot_cursor + 1) % len(self.slots)
+        for offset in range(len(self.slots)):
+            slot = self.slots[(start + offset) % len(self.slots)]
+            if slot.lock.acquire(blocking=False):
+                return slot
+        slot = self.slots[start]
+        slot.lock.acquire()
+        return slot
+
+    def fault(self) -> Tuple[Optional[int], float]:
+        """Returns the HTTP error status (if any) and extra latency to inject."""
+        with self.slot_lock:
+            error_roll, slow_roll = self.random.random(), self.random.random()
+        if self.down:
+            return 503, 0.0
+        if error_roll < self.error_rate:
+            return 500, 0.0
+        return None, self.slow_latency if slow_roll < self.slow_rate else 0.0
+
+    def complete(self, body: dict) -> dict:
+        messages = body.get("messages", [])
+        prompt = "".join(f"<|{m['role']}|>{m['content']}" for m in messages)
+        prompt_tokens = estimate_tokens(prompt)
+
+        slot = self._acquire_slot(body.get("id_slot"))
+        try:
+            cached_tokens = 0
+            if body.get("cache_prompt"):
+                cached_tokens = estimate_tokens(prompt[:_common_prefix_length(slot.prompt, prompt)])
+                slot.prompt = prompt
+            else:
+                slot.prompt = ""
+            uncached_tokens = prompt_tokens - cached_tokens
+            time.sleep(self.latency + self.token_latency * uncached_tokens)
+        finally:
+            slot.lock.release()
+
+        content = mock_completion(messages)
+        completion_tokens = estimate_tokens(content)
+        with self.slot_lock:
+            self.request_count += 1
+            request_id = self.request_count
+        return {
+            "id": f"chatcmpl-mock-{request_id}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+            "timings": {
+                "prompt_n": uncached_tokens,
+                "cache_n": cached_tokens,
+                "predicted_n": completion_tokens,
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/health":
+                    self._send_json(200, {"status": "ok"})
+                elif self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError as e:
+                    self._send_json(400, {"error": {"message": f"Invalid JSON: {e}"}})
+                    return
+                status, delay = server.fault()
+                time.sleep(delay)
+                if status is not None:
+                    self._send_json(status, {"error": {"message": f"Injected fault ({status})"}})
+                    return
+                self._send_json(200, server.complete(body))
+
+            def log_message(self, format, *args):
+                logger.debug(f"mock_server {format % args}")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Fixed seconds per request')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='Seconds per uncached prompt token')
+    parser.add_argument('--slots', type=int, default=int(os.getenv("CODERIP_LOCAL_SLOTS", "1")))
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of requests delayed by --slow-latency')
+    parser.add_argument('--slow-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port, args.latency, args.token_latency, args.slots,
+        error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+    )
+    server.start()
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Parses model responses into labeled code sections.
+
+Model output is expected to contain sections demarcated by:
+
+    #|open:label
+    ...
+    #|close:label
+
+optionally wrapped in fenced code blocks, and optionally still carrying the
+`N: ` line number prefixes injected by `TagFinder.get_code_by_label`.
+
+The parser is deliberately tolerant: missing close tags, mismatched labels,
+nested fences and untagged fenced blocks are recovered locally, and every
+recovery is recorded in `ParsedResponse.issues`, so that a malformed response
+does not require a second round trip to the model.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import re
+
+OPEN_TAG = re.compile(r'^\s*#\|open(?::(\w+))?\s*>?')
+CLOSE_TAG = re.compile(r'^\s*#\|close(?::(\w+))?\s*>?')
+FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([\w+.-]*)\s*$')
+LINE_NUMBER = re.compile(r'^(\d+): ?')
+
+
+@dataclass
+class ParsedResponse:
+    sections: Dict[str, str] = field(default_factory=dict)
+    issues: List[str] = field(default_factory=list)
+
+    def missing(self, labels: List[str]) -> List[str]:
+        """Returns the expected labels that were not recovered."""
+        return [label for label in labels if label not in self.sections]
+
+
+@dataclass
+class _OpenSection:
+    label: Optional[str]
+    start: int
+    fence_depth: int
+
+
+def strip_line_numbers(lines: List[str], first_line: Optional[int] = None) -> List[str]:
+    """Removes `N: ` prefixes if (and only if) they look injected.
+
+    `TagFinder.get_code_by_label` numbers every line, blank lines included, so
+    prefixes are considered injected when every line carries one and the
+    numbers are consecutive. Code such as `1: "one",` in a dict literal is left
+    alone.
+
+    Edited code usually gains or loses lines, so with `first_line`, the number
+    of the first line that was sent, prefixes are also injected when the
+    numbered lines start there and never decrease. Unnumbered lines are taken
+    to be insertions.
+    """
+    numbered = [LINE_NUMBER.match(line) for line in lines]
+    numbers = [int(match.group(1)) for match in numbered if match]
+    if not numbers:
+        return lines
+    increasing = all(b >= a for a, b in zip(numbers, numbers[1:]))
+    consecutive = len(numbers) == len(lines) and all(b == a + 1 for a, b in zip(numbers, numbers[1:]))
+    anchored = first_line is not None and numbers[0] == first_line and increasing
+    if not consecutive and not anchored:
+        return lines
+    return [line[match.end():] if match else line for line, match in zip(lines, numbered)]
+
+
+def _strip_wrapping_fences(lines: List[str]) -> List[str]:
+    """Removes fence lines wrapping an entire section body."""
+    start, end = 0, len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    if start < end and FENCE.match(lines[start]):
+        start += 1
+        if end > start and FENCE.match(lines[end - 1]) and not FENCE.match(lines[end - 1]).group(2):
+            end -= 1
+    elif end > start and FENCE.match(lines[end - 1]):
+        end -= 1
+    return lines[start:end]
+
+
+def _clean_body(lines: List[str], first_line: Optional[int] = None) -> str:
+    body = strip_line_numbers(_strip_wrapping_fences(lines), first_line)
+    return '\n'.join(body)
+
+
+def _fenced_blocks(lines: List[str]) -> List[List[str]]:
+    """Returns the contents of top-level fenced blocks, tolerating nesting."""
+    blocks = []
+    depth = 0
+    current: List[str] = []
+    for line in lines:
+        fence = FENCE.match(line)
+        if fence:
+            opening = depth == 0 or bool(fence.group(2))
+            if opening:
+                depth += 1
+                if depth == 1:
+                    current = []
+                    continue
+            else:
+                depth -= 1
+                if depth == 0:
+                    blocks.append(current)
+                    continue
+        if depth:
+            current.append(line)
+    if depth and current:
+        # Unterminated fence: keep what we have
+        blocks.append(current)
+    return blocks
+
+
+def parse_response(
+    text: str,
+    labels: Optional[List[str]] = None,
+    first_lines: Optional[Dict[str, int]] = None,
+) -> ParsedResponse:
+    """Extracts a map of label -> code from a model response.
+
+    `labels` are the labels that were sent to the model. They are used to
+    resolve unlabeled or misspelled tags and to assign untagged fenced blocks
+    when the model ignores the tag format altogether. `first_lines` maps labels
+    sent with line numbers to the number of their first line (see
+    `strip_line_numbers`).
+    """
+    result = ParsedResponse()
+    labels = labels or []
+    first_lines = first_lines or {}
+    lines = text.replace('\r\n', '\n').split('\n')
+
+    stack: List[_OpenSection] = []
+    fence_depth = 0
+    fence_starts: List[int] = []
+    saw_tags = False
+
+    def close(index: int, end: int):
+        section = stack.pop(index)
+        label = section.label
+        if label is None:
+            label = _infer_label(result, labels)
+            if label is None:
+                result.issues.append(f"Dropped unlabeled section at line {section.start}")
+                return
+            result.issues.append(f"Assigned unlabeled section at line {section.start} to {label!r}")
+        body = _clean_body(lines[section.start:end], first_lines.get(label))
+        if label in result.sections:
+            result.issues.append(f"Duplicate section {label!r}; keeping the last one")
+        result.sections[label] = body
+
+    for i, line in enumerate(lines):
+        open_match = OPEN_TAG.match(line)
+        close_match = CLOSE_TAG.match(line)
+
+        if open_match:
+            saw_tags = True
+            label = open_match.group(1)
+            for j in range(len(stack) - 1, -1, -1):
+                if label is not None and stack[j].label == label:
+                    result.issues.append(f"Missing close tag for {label!r} (reopened at line {i + 1})")
+                    close(j, i)
+                    break
+            stack.append(_OpenSection(label, i + 1, fence_depth))
+        elif close_match:
+            saw_tags = True
+            label = close_match.group(1)
+            if not stack:
+                start = fence_starts[-1] if fence_starts else None
+                if label is not None and start is not None:
+                    result.issues.append(f"Missing open tag for {label!r}; using enclosing fence")
+                    stack.append(_OpenSection(label, start, fence_depth))
+                    close(len(stack) - 1, i)
+                else:
+                    result.issues.append(f"Ignored unmatched close tag at line {i + 1}")
+                continue
+            match_index = None
+            for j in range(len(stack) - 1, -1, -1):
+                if stack[j].label == label:
+                    match_index = j
+                    break
+            if match_index is None:
+                if stack[-1].label is None:
+                    stack[-1].label = label
+                elif label is not None:
+                    result.issues.append(
+                        f"Mismatched close tag {label!r} at line {i + 1}; "
+                        f"closing {stack[-1].label!r}"
+                    )
+                match_index = len(stack) - 1
+            while len(stack) - 1 > match_index:
+                result.issues.append(f"Missing close tag for {stack[-1].label!r}")
+                close(len(stack) - 1, i)
+            close(match_index, i)
+        else:
+            fence = FENCE.match(line)
+            if fence:
+                opening = (
+                    fence_depth == 0
+                    or bool(fence.group(2))
+                    or _opens_section_body(lines, stack, fence_depth, i)
+                )
+                if opening:
+                    fence_depth += 1
+                    fence_starts.append(i + 1)
+                else:
+                    # A bare fence closes the innermost block; sections opened
+                    # inside that block cannot outlive it.
+                    while stack and stack[-1].fence_depth >= fence_depth:
+                        result.issues.append(f"Missing close tag for {stack[-1].label!r} (fence ended)")
+                        close(len(stack) - 1, i)
+                    fence_depth -= 1
+                    fence_starts.pop()
+
+    while stack:
+        result.issues.append(f"Missing close tag for {stack[-1].label!r} (end of response)")
+        close(len(stack) - 1, len(lines))
+
+    if not saw_tags:
+        _assign_fenced_blocks(result, lines, labels, first_lines)
+
+    return result
+
+
+def _opens_section_body(lines: List[str], stack: List[_OpenSection], fence_depth: int, i: int) -> bool:
+    """Whether a bare fence directly follows an open tag, i.e. wraps its body."""
+    if not stack or stack[-1].fence_depth != fence_depth:
+        return False
+    return not any(line.strip() for line in lines[stack[-1].start:i])
+
+
+def _infer_label(result: ParsedResponse, labels: List[str]) -> Optional[str]:
+    remaining = [label for label in labels if label not in result.sections]
+    if len(remaining) == 1:
+        return remaining[0]
+    return None
+
+
+def _assign_fenced_blocks(result: ParsedResponse, lines: List[str], labels: List[str], first_lines: Dict[str, int]):
+    blocks = [block for block in _fenced_blocks(lines) if any(line.strip() for line in block)]
+    if not blocks:
+        return
+    if len(labels) == 1:
+        block = max(blocks, key=len)
+        result.sections[labels[0]] = _clean_body(block, first_lines.get(labels[0]))
+        result.issues.append(f"No tags found; assigned largest fenced block to {labels[0]!r}")
+    elif labels and len(blocks) == len(labels):
+        for label, block in zip(labels, blocks):
+            result.sections[label] = _clean_body(block, first_lines.get(label))
+        result.issues.append("No tags found; assigned fenced blocks to labels in order")
+    else:
+        result.issues.append(f"No tags found and {len(blocks)} fenced blocks for {len(labels)} labels")
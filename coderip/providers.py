@@ -0,0 +1,213 @@
+"""Model providers behind a common interface.
+
+Every provider takes a list of chat messages and returns a `ModelResponse`,
+or raises `ModelError`. `LocalProvider` talks to any OpenAI-compatible server
+(llama.cpp's `server`, ollama) and asks it to reuse the KV cache of the
+previous prompt, so that the shared system message and code context are not
+re-processed for every follow-up.
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import threading
+import time
+import zlib
+
+from loguru import logger
+from openai import OpenAI
+
+from coderip import config
+
+Messages = List[Dict[str, str]]
+
+
+class ModelError(Exception):
+    """Raised when a provider cannot produce a response."""
+
+
+@dataclass
+class ModelResponse:
+    content: str
+    provider: str
+    model: str
+    latency: float
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for budgeting."""
+    return (len(text) + 3) // 4
+
+
+class Provider(ABC):
+    name = "provider"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abstractmethod
+    def complete(self, messages: Messages, model: Optional[str] = None, session: Optional[str] = None) -> ModelResponse:
+        """Returns the model's response to `messages`, raising ModelError on failure."""
+
+    def complete_batch(
+        self,
+        batch: List[Messages],
+        model: Optional[str] = None,
+        sessions: Optional[List[Optional[str]]] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[ModelResponse]:
+        """Sends several requests concurrently, returning responses in order.
+
+        Servers with continuous batching (e.g. llama.cpp with `--parallel N`)
+        process concurrent requests together.
+        """
+        if not batch:
+            return []
+        sessions = sessions or [None] * len(batch)
+        with ThreadPoolExecutor(max_workers=max_workers or len(batch)) as executor:
+            futures = [
+                executor.submit(self.complete, messages, model, session)
+                for messages, session in zip(batch, sessions)
+            ]
+            return [future.result() for future in futures]
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str = config.OPENAI_MODEL,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: int = 2,
+    ):
+        super().__init__(model)
+        client_kwargs = {"timeout": timeout} if timeout is not None else {}
+        self.client = OpenAI(
+            api_key=api_key or config.OPENAI_API_KEY or "YOUR_API_KEY",
+            base_url=base_url,
+            max_retries=max_retries,
+            **client_kwargs,
+        )
+
+    def _extra_body(self, session: Optional[str]) -> Optional[dict]:
+        return None
+
+    def complete(self, messages: Messages, model: Optional[str] = None, session: Optional[str] = None) -> ModelResponse:
+        model = model or self.model
+        logger.info(f"Requesting completion {self.name=} {model=} {session=}")
+        start = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                extra_body=self._extra_body(session),
+            )
+        except Exception as e:
+            raise ModelError(f"{self.name} request failed: {e}") from e
+        latency = time.perf_counter() - start
+
+        content = response.choices[0].message.content
+        if content is None:
+            raise ModelError(f"{self.name} returned an empty response")
+
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None)
+        if cached_tokens is None:
+            # llama.cpp reports prompt cache hits in its own `timings` block
+            timings = (getattr(response, "model_extra", None) or {}).get("timings") or {}
+            cached_tokens = timings.get("cache_n", 0)
+        model_response = ModelResponse(
+            content=content,
+            provider=self.name,
+            model=model,
+            latency=latency,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            cached_tokens=cached_tokens or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+        logger.info(
+            f"Completion received {self.name=} latency={latency:.3f}s "
+            f"{model_response.prompt_tokens=} {model_response.cached_tokens=}"
+        )
+        return model_response
+
+
+class LocalProvider(OpenAIProvider):
+    """OpenAI-compatible local server, e.g. llama.cpp `server` or ollama."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        base_url: str = config.LOCAL_MODEL_URL,
+        model: str = config.LOCAL_MODEL,
+        slots: int = config.LOCAL_MODEL_SLOTS,
+        cache_prompt: bool = True,
+        timeout: Optional[float] = None,
+        max_retries: int = 0,
+    ):
+        super().__init__(
+            model=model,
+            api_key="sk-no-key-required",
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+        )
+        self.slots = slots
+        self.cache_prompt = cache_prompt
+
+    def _extra_body(self, session: Optional[str]) -> Optional[dict]:
+        # Keep the prompt in the server's KV cache so the next request sharing
+        # its prefix only processes the new tokens, and pin each session to a
+        # slot so that unrelated requests don't evict its cache.
+        body = {"cache_prompt": self.cache_prompt}
+        if session is not None and self.slots > 1:
+            body["id_slot"] = zlib.crc32(session.encode()) % self.slots
+        return body
+
+
+PROVIDERS = {
+    OpenAIProvider.name: OpenAIProvider,
+    LocalProvider.name: LocalProvider,
+}
+
+
+def get_provider(name: Optional[str] = None, **kwargs) -> Provider:
+    """Returns the provider called `name`, or a router for "a,b,..." names."""
+    name = name or config.MODEL_PROVIDER
+    names = [part.strip() for part in name.split(",") if part.strip()]
+    unknown = [part for part in names if part not in PROVIDERS]
+    if unknown or not names:
+        raise ValueError(f"Unknown provider {name!r}, expected one of {sorted(PROVIDERS)}")
+    if len(names) == 1:
+        return PROVIDERS[names[0]](**kwargs)
+
+    from coderip.router import ProviderRouter
+
+    # Retries would delay failover, so leave them to the router
+    providers = [PROVIDERS[part](max_retries=0, **kwargs) for part in names]
+    return ProviderRouter(providers, hedge_after=config.HEDGE_AFTER)
+
+
+_default_providers: Dict[str, Provider] = {}
+_default_providers_lock = threading.Lock()
+
+
+def get_default_provider() -> Provider:
+    """Returns a shared provider for `config.MODEL_PROVIDER`.
+
+    Sharing the instance keeps routing stats across requests.
+    """
+    name = config.MODEL_PROVIDER
+    with _default_providers_lock:
+        if name not in _default_providers:
+            _default_providers[name] = get_provider(name)
+        return _default_providers[name]
@@ -0,0 +1,125 @@
+"""Routes requests across providers with failover and hedging.
+
+`ProviderRouter` is itself a `Provider`. It tries providers in their
+configured order, skipping those whose recent error rate is too high, and
+fails over to the next provider on error. With `hedge_after` set, a duplicate
+request is sent to the next provider if the current one hasn't answered
+within that many seconds, and the first good answer wins.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import threading
+import time
+
+from loguru import logger
+
+from coderip.providers import Messages, ModelError, ModelResponse, Provider
+
+
+@dataclass
+class ProviderStats:
+    requests: int = 0
+    errors: int = 0
+    latency: Optional[float] = None  # exponentially weighted moving average
+    error_rate: float = 0.0  # exponentially weighted moving average
+    last_error_time: float = 0.0
+
+    def record(self, latency: float, ok: bool, alpha: float):
+        self.requests += 1
+        if ok:
+            self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        else:
+            self.errors += 1
+            self.last_error_time = time.monotonic()
+        self.error_rate = alpha * (0.0 if ok else 1.0) + (1 - alpha) * self.error_rate
+
+
+class ProviderRouter(Provider):
+    name = "router"
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge_after: Optional[float] = None,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        alpha: float = 0.3,
+        accept: Optional[Callable[[ModelResponse], bool]] = None,
+    ):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        super().__init__(providers[0].model)
+        self.providers = providers
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.accept = accept
+        self.stats: Dict[str, ProviderStats] = {
+            self._key(provider): ProviderStats() for provider in providers
+        }
+        self.stats_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(providers)))
+
+    def _key(self, provider: Provider) -> str:
+        return f"{provider.name}:{provider.model}:{self.providers.index(provider)}"
+
+    def is_healthy(self, provider: Provider) -> bool:
+        stats = self.stats[self._key(provider)]
+        if stats.error_rate < self.max_error_rate:
+            return True
+        # Give failing providers another chance once the cooldown has passed
+        return time.monotonic() - stats.last_error_time > self.cooldown
+
+    def ranked(self) -> List[Provider]:
+        """Returns providers in configured order, healthy ones first."""
+        with self.stats_lock:
+            return sorted(self.providers, key=lambda provider: not self.is_healthy(provider))
+
+    def _call(self, provider: Provider, messages: Messages, model: Optional[str], session: Optional[str]) -> ModelResponse:
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = provider.complete(messages, model=model, session=session)
+            if self.accept and not self.accept(response):
+                raise ModelError(f"{provider.name} response rejected")
+            ok = True
+            return response
+        finally:
+            with self.stats_lock:
+                self.stats[self._key(provider)].record(time.perf_counter() - start, ok, self.alpha)
+
+    def complete(self, messages: Messages, model: Optional[str] = None, session: Optional[str] = None) -> ModelResponse:
+        candidates = self.ranked()
+        pending: Dict[Future, Provider] = {}
+        errors = []
+
+        def launch():
+            provider = candidates.pop(0)
+            logger.info(f"Routing request to {provider.name=} {provider.model=}")
+            pending[self.executor.submit(self._call, provider, messages, model, session)] = provider
+
+        launch()
+        while pending:
+            timeout = self.hedge_after if self.hedge_after is not None and candidates else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"No response after {self.hedge_after}s, hedging with next provider")
+                launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.warning(f"Provider failed {provider.name=} {e=}")
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                # Any hedged requests still in flight finish in the background
+                # and only update the stats.
+                return response
+            if candidates and not pending:
+                launch()
+        raise ModelError(f"All providers failed: {'; '.join(errors)}")
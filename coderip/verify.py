@@ -0,0 +1,361 @@
+"""Verifies candidate edits by running a command in isolated workspaces.
+
+Each candidate (a list of `Edit`s, e.g. parsed from one of several model
+responses) is applied to its own copy of the source directory, and the test
+command runs in each copy in parallel, with a timeout. Output is streamed line
+by line to a log file per candidate (and optionally to a callback), so a slow
+run can be followed while it runs. `Verifier.verify` returns as soon as a
+candidate passes, stopping the others, unless asked to wait for all of them.
+
+Workspaces are either git worktrees checked out at a snapshot of the current
+working tree (`git stash create`, which leaves the tree alone, plus untracked
+files), or hardlinked copies of the directory. Hardlinked copies work outside
+git and never copy file contents, but a command that rewrites an existing
+file in place (rather than replacing it) also changes the original, so
+worktrees are the default inside git repositories. Edits are always written
+to a new file that replaces the link.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from coderip import config
+from coderip.edits import Edit, EditConflict, apply_to_files
+
+# Not copied into hardlinked workspaces
+SKIP_DIRS = {".git", ".coderip", "__pycache__", ".pytest_cache", ".mypy_cache"}
+TAIL_LINES = 40
+
+OutputCallback = Callable[[str, str], None]
+
+
+class VerificationError(Exception):
+    """Raised when a candidate cannot be verified, e.g. its workspace cannot be created."""
+
+
+@dataclass
+class CandidateResult:
+    candidate: str
+    passed: bool
+    returncode: Optional[int] = None
+    duration: float = 0.0
+    timed_out: bool = False
+    # Stopped because another candidate passed first
+    cancelled: bool = False
+    error: Optional[str] = None
+    log_path: Optional[str] = None
+    # The last lines of output
+    tail: str = ""
+
+    @property
+    def status(self) -> str:
+        if self.passed:
+            return "passed"
+        if self.cancelled:
+            return "cancelled"
+        if self.timed_out:
+            return "timed out"
+        if self.error:
+            return f"error: {self.error}"
+        return f"failed (exit code {self.returncode})"
+
+
+@dataclass
+class VerificationReport:
+    command: str
+    # In order of completion
+    results: List[CandidateResult] = field(default_factory=list)
+    first_passed: Optional[str] = None
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        lines = [f"Verified {len(self.results)} candidate(s) with `{self.command}` in {self.elapsed:.1f}s:"]
+        for result in self.results:
+            lines.append(f"  {result.candidate}: {result.status} ({result.duration:.1f}s)")
+        lines.append(f"First to pass: {self.first_passed}" if self.first_passed else "No candidate passed.")
+        return "\n".join(lines)
+
+
+def _git(directory: str, *args: str) -> bytes:
+    result = subprocess.run(["git", "-C", directory, *args], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise VerificationError(f"git {args[0]} failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _link_or_copy(source: str, destination: str):
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), destination)
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        # e.g. across filesystems
+        shutil.copy2(source, destination)
+
+
+def link_tree(source: str, destination: str):
+    """Recreates `source` at `destination` with hardlinks instead of copies."""
+    for root, dirs, files in os.walk(source):
+        target_root = os.path.join(destination, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        walked = []
+        for name in dirs:
+            if name in SKIP_DIRS:
+                continue
+            if os.path.islink(os.path.join(root, name)):
+                _link_or_copy(os.path.join(root, name), os.path.join(target_root, name))
+            else:
+                walked.append(name)
+        dirs[:] = walked
+        for name in files:
+            _link_or_copy(os.path.join(root, name), os.path.join(target_root, name))
+
+
+@dataclass
+class Workspace:
+    # Temporary directory holding the copy
+    path: str
+    # The copy of the source directory, where commands run
+    root: str
+    source_dir: str
+    # The repository this is a worktree of, if any
+    repository: Optional[str] = None
+
+    def path_for(self, path: str) -> str:
+        """Maps a path in the source directory to its copy in the workspace."""
+        relative_path = os.path.relpath(os.path.realpath(path), self.source_dir)
+        if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+            raise VerificationError(f"{path} is outside {self.source_dir}")
+        return os.path.join(self.root, relative_path)
+
+    def remove(self):
+        if self.repository:
+            try:
+                _git(self.repository, "worktree", "remove", "--force", self.path)
+            except VerificationError as e:
+                logger.warning(f"Could not remove worktree {self.path=}: {e}")
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspaceFactory:
+    """Creates workspaces from one snapshot of the source directory."""
+
+    # `git worktree add` updates shared repository metadata
+    _git_lock = threading.Lock()
+
+    def __init__(self, source_dir: str, isolation: str = config.VERIFY_ISOLATION):
+        if isolation not in ("worktree", "hardlink"):
+            raise ValueError(f"Unknown isolation {isolation!r}, expected worktree or hardlink")
+        # Resolved like git resolves the repository root
+        self.source_dir = os.path.realpath(source_dir)
+        self.isolation = isolation
+        self.repository: Optional[str] = None
+        if isolation == "worktree":
+            try:
+                self._snapshot()
+            except VerificationError as e:
+                logger.warning(f"Using hardlinked copies instead of worktrees: {e}")
+                self.isolation = "hardlink"
+
+    def _snapshot(self):
+        self.repository = _git(self.source_dir, "rev-parse", "--show-toplevel").decode().strip()
+        # A commit of the working tree's tracked changes; empty if there are none
+        self.commit = _git(self.repository, "stash", "create").decode().strip() or "HEAD"
+        output = _git(self.repository, "ls-files", "--others", "--exclude-standard", "-z")
+        self.untracked = [path for path in output.decode(errors="surrogateescape").split("\0") if path]
+
+    def create(self, name: str) -> Workspace:
+        prefix = re.sub(r'[^\w.-]', '_', name)
+        path = tempfile.mkdtemp(prefix=f"coderip-{prefix}-")
+        if self.isolation == "hardlink":
+            root = os.path.join(path, os.path.basename(self.source_dir))
+            link_tree(self.source_dir, root)
+            return Workspace(path=path, root=root, source_dir=self.source_dir)
+
+        workspace = Workspace(
+            path=path,
+            root=os.path.normpath(os.path.join(path, os.path.relpath(self.source_dir, self.repository))),
+            source_dir=self.source_dir,
+            repository=self.repository,
+        )
+        try:
+            with self._git_lock:
+                _git(self.repository, "worktree", "add", "--detach", "--quiet", path, self.commit)
+            for relative_path in self.untracked:
+                destination = os.path.join(path, relative_path)
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                _link_or_copy(os.path.join(self.repository, relative_path), destination)
+        except (VerificationError, OSError):
+            workspace.remove()
+            raise
+        return workspace
+
+
+def _kill(process: subprocess.Popen):
+    """Kills the process and everything it started."""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Verifier:
+    def __init__(
+        self,
+        source_dir: str,
+        command: str,
+        parallel: int = config.VERIFY_PARALLEL,
+        timeout: Optional[float] = config.VERIFY_TIMEOUT,
+        isolation: str = config.VERIFY_ISOLATION,
+        log_dir: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None,
+    ):
+        self.source_dir = source_dir
+        self.command = command
+        self.parallel = parallel
+        self.timeout = timeout
+        self.isolation = isolation
+        self.log_dir = log_dir
+        # Called with (candidate, line) for every line of output
+        self.on_output = on_output
+        self._processes: Dict[str, subprocess.Popen] = {}
+        self._processes_lock = threading.Lock()
+
+    def verify(
+        self,
+        candidates: Dict[str, List[Edit]],
+        wait_all: bool = False,
+        labels: Optional[List[str]] = None,
+    ) -> VerificationReport:
+        """Runs the command against every candidate, returning once one passes.
+
+        With `wait_all`, every candidate runs to completion. A candidate without
+        edits, or without an edit for each of `labels`, fails without running:
+        the unmodified tree passing says nothing about it.
+        """
+        start_time = time.perf_counter()
+        report = VerificationReport(command=self.command)
+        log_dir = self.log_dir or os.path.join(config.VERIFY_DIR, datetime.now().strftime("%Y%m%d-%H%M%S-%f"))
+        os.makedirs(log_dir, exist_ok=True)
+        factory = WorkspaceFactory(self.source_dir, self.isolation)
+        cancel = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            futures = {
+                executor.submit(self._run_candidate, factory, name, edits, labels or [], log_dir, cancel): name
+                for name, edits in candidates.items()
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    result = CandidateResult(futures[future], passed=False, cancelled=True)
+                else:
+                    result = future.result()
+                report.results.append(result)
+                logger.info(f"Candidate {result.candidate} {result.status} in {result.duration:.2f}s")
+                if result.passed and report.first_passed is None:
+                    report.first_passed = result.candidate
+                    if not wait_all:
+                        self._cancel(futures, cancel)
+        report.elapsed = time.perf_counter() - start_time
+        return report
+
+    def _cancel(self, futures, cancel: threading.Event):
+        cancel.set()
+        for future in futures:
+            future.cancel()
+        with self._processes_lock:
+            for process in self._processes.values():
+                _kill(process)
+
+    def _run_candidate(
+        self,
+        factory: WorkspaceFactory,
+        name: str,
+        edits: List[Edit],
+        labels: List[str],
+        log_dir: str,
+        cancel: threading.Event,
+    ) -> CandidateResult:
+        start_time = time.perf_counter()
+        result = CandidateResult(name, passed=False, log_path=os.path.join(log_dir, f"{name}.log"))
+        workspace = None
+        try:
+            missing = [label for label in labels if label not in {edit.label for edit in edits}]
+            if not edits:
+                raise VerificationError("no edits")
+            if missing:
+                raise VerificationError(f"no edits for {', '.join(missing)}")
+            workspace = factory.create(name)
+            apply_to_files([Edit(**{**asdict(edit), "path": workspace.path_for(edit.path)}) for edit in edits])
+            if not cancel.is_set():
+                self._run_command(name, workspace.root, result, cancel)
+        except (EditConflict, VerificationError, OSError) as e:
+            result.error = str(e)
+        finally:
+            if workspace:
+                workspace.remove()
+        result.cancelled = cancel.is_set() and not result.passed
+        result.duration = time.perf_counter() - start_time
+        return result
+
+    def _run_command(self, name: str, cwd: str, result: CandidateResult, cancel: threading.Event):
+        """Runs the command in `cwd`, streaming its output to the log and callback."""
+        tail = deque(maxlen=TAIL_LINES)
+        with open(result.log_path, "w") as log_file:
+            process = subprocess.Popen(
+                self.command,
+                shell=True,
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                # Its own process group, so that a timeout kills the whole tree
+                start_new_session=hasattr(os, "killpg"),
+            )
+            with self._processes_lock:
+                self._processes[name] = process
+            timed_out = threading.Event()
+
+            def on_timeout():
+                timed_out.set()
+                _kill(process)
+
+            timer = threading.Timer(self.timeout, on_timeout) if self.timeout else None
+            if timer:
+                timer.start()
+            try:
+                if cancel.is_set():
+                    _kill(process)
+                for raw_line in process.stdout:
+                    line = raw_line.decode("utf-8", errors="replace")
+                    log_file.write(line)
+                    log_file.flush()
+                    tail.append(line)
+                    if self.on_output:
+                        self.on_output(name, line)
+                result.returncode = process.wait()
+            finally:
+                if timer:
+                    timer.cancel()
+                with self._processes_lock:
+                    self._processes.pop(name, None)
+        result.timed_out = timed_out.is_set()
+        result.passed = result.returncode == 0 and not result.timed_out
+        result.tail = "".join(tail)
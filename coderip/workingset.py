@@ -0,0 +1,193 @@
+"""Git-aware working set: the files most likely to matter right now.
+
+The working set is built from a single `git status --porcelain -z` call
+(modified, staged and untracked files) plus the entries of `.git/index` that
+were touched recently, read directly from the index file rather than by
+running git once per file. Files that are modified in the working tree come
+first, most recently modified first, followed by recently touched tracked
+files.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import os
+import struct
+import subprocess
+import time
+
+from loguru import logger
+
+from coderip import config
+
+INDEX_SIGNATURE = b"DIRC"
+INDEX_ENTRY_FIXED_SIZE = 62  # stat data (40) + object id (20) + flags (2)
+INDEX_EXTENDED_FLAG = 0x4000
+INDEX_NAME_MASK = 0x0FFF
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    path: str
+    mtime: float
+    size: int
+
+
+@dataclass
+class WorkingSet:
+    root: str
+    # absolute path (under the directory, as walking it would find it) -> two-letter
+    # porcelain status, e.g. " M", "A ", "??"
+    changes: Dict[str, str]
+    # absolute paths, highest priority first
+    paths: List[str]
+
+    def __post_init__(self):
+        self.path_set = set(self.paths)
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self.path_set
+
+
+def _run_git(directory: str, *args: str) -> Optional[bytes]:
+    try:
+        result = subprocess.run(
+            ["git", "-C", directory, *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        logger.warning("git not found, working set disabled")
+        return None
+    if result.returncode != 0:
+        logger.debug(f"git {args[0]} failed {result.stderr.decode(errors='replace')=}")
+        return None
+    return result.stdout
+
+
+def parse_porcelain(output: bytes) -> List[Tuple[str, str]]:
+    """Parses `git status --porcelain -z` output into (status, path) pairs."""
+    entries = []
+    records = output.split(b"\0")
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if len(record) < 4:
+            continue
+        status, path = record[:2].decode(), record[3:].decode(errors="surrogateescape")
+        if status[0] in "RC":
+            # Renames and copies are followed by the original path
+            i += 1
+        entries.append((status, path))
+    return entries
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """Reads the offset-encoded integer used by index v4 path compression."""
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        value += 1
+        byte = data[offset]
+        offset += 1
+        value = (value << 7) + (byte & 0x7F)
+    return value, offset
+
+
+def read_index(git_dir: str) -> List[IndexEntry]:
+    """Reads path, mtime and size of every entry in `.git/index` (v2-v4)."""
+    with open(os.path.join(git_dir, "index"), "rb") as file:
+        data = file.read()
+    signature, version, count = struct.unpack(">4sII", data[:12])
+    if signature != INDEX_SIGNATURE or version not in (2, 3, 4):
+        raise ValueError(f"Unsupported index {signature=} {version=}")
+
+    entries = []
+    offset = 12
+    previous_path = b""
+    for _ in range(count):
+        start = offset
+        mtime_s, mtime_ns = struct.unpack(">II", data[offset + 8:offset + 16])
+        size, = struct.unpack(">I", data[offset + 36:offset + 40])
+        flags, = struct.unpack(">H", data[offset + 60:offset + 62])
+        offset += INDEX_ENTRY_FIXED_SIZE
+        if version >= 3 and flags & INDEX_EXTENDED_FLAG:
+            offset += 2
+        if version == 4:
+            strip, offset = _read_varint(data, offset)
+            end = data.index(b"\0", offset)
+            path = previous_path[:len(previous_path) - strip] + data[offset:end]
+            offset = end + 1
+        else:
+            name_length = flags & INDEX_NAME_MASK
+            if name_length == INDEX_NAME_MASK:
+                end = data.index(b"\0", offset)
+            else:
+                end = offset + name_length
+            path = data[offset:end]
+            # Entries are NUL-padded to a multiple of eight bytes
+            offset = start + ((end - start) // 8 + 1) * 8
+        previous_path = path
+        entries.append(IndexEntry(path.decode(errors="surrogateescape"), mtime_s + mtime_ns / 1e9, size))
+    return entries
+
+
+def _under_directory(directory: str, real_directory: str, root: str, path: str) -> Optional[str]:
+    """Maps a path relative to the repository root to the same file under `directory`.
+
+    git resolves symlinks in `root`, whereas `directory` may be reached through
+    one, so paths are matched on their real location but returned under
+    `directory`, like the paths found by walking it. Returns None for paths
+    outside `directory`.
+    """
+    relative_path = os.path.relpath(os.path.join(root, path), real_directory)
+    if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+        return None
+    return os.path.join(directory, relative_path)
+
+
+def get_working_set(directory: str, recent_seconds: Optional[float] = None) -> Optional[WorkingSet]:
+    """Returns the working set for `directory`, or None outside a git repository."""
+    if recent_seconds is None:
+        recent_seconds = config.WORKING_SET_RECENT_SECONDS
+    output = _run_git(directory, "rev-parse", "--show-toplevel", "--absolute-git-dir")
+    if output is None:
+        return None
+    root, git_dir = output.decode().splitlines()[:2]
+
+    output = _run_git(directory, "status", "--porcelain", "-z", "--untracked-files=all", "--", ".")
+    if output is None:
+        return None
+    directory, real_directory = os.path.abspath(directory), os.path.realpath(directory)
+    changes = {}
+    for status, path in parse_porcelain(output):
+        absolute_path = _under_directory(directory, real_directory, root, path)
+        if absolute_path and status[1] != "D" and status[0] != "D" and os.path.isfile(absolute_path):
+            changes[absolute_path] = status
+
+    def mtime(path: str) -> float:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    paths = sorted(changes, key=mtime, reverse=True)
+
+    recent = []
+    cutoff = time.time() - recent_seconds
+    try:
+        index_entries = read_index(git_dir)
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"Could not read git index {e=}")
+        index_entries = []
+    for entry in index_entries:
+        if entry.mtime < cutoff:
+            continue
+        absolute_path = _under_directory(directory, real_directory, root, entry.path)
+        if absolute_path and absolute_path not in changes and os.path.isfile(absolute_path):
+            recent.append((entry.mtime, absolute_path))
+    paths += [path for _, path in sorted(recent, reverse=True)]
+
+    logger.info(f"Working set {root=} changed={len(changes)} recent={len(recent)}")
+    return WorkingSet(root=root, changes=changes, paths=paths)
@@ -0,0 +1,47 @@
+from coderip.batch import BatchRunner, Job
+from coderip.main import TagFinder
+from coderip.providers import ModelResponse, Provider
+
+
+class StubProvider(Provider):
+    name = "stub"
+
+    def __init__(self, content: str):
+        super().__init__("stub")
+        self.content = content
+
+    def complete(self, messages, model=None, session=None) -> ModelResponse:
+        return ModelResponse(content=self.content, provider=self.name, model=self.model, latency=0.0)
+
+
+def make_runner(tmp_path, monkeypatch, content: str) -> BatchRunner:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.py").write_text("#|open:a\nx = 1\n#|close:a\n")
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory(".")
+    return BatchRunner(tag_finder, ".", output_dir=str(tmp_path / "out"), provider=StubProvider(content), apply=True)
+
+
+def test_applies_and_skips_done_jobs(tmp_path, monkeypatch):
+    runner = make_runner(tmp_path, monkeypatch, "#|open:a\nx = 2\n#|close:a")
+    jobs = [Job(id="job", instruction="Change x", tags=["a"])]
+    assert runner.run(jobs).statuses == {"applied": 1}
+    assert (tmp_path / "f.py").read_text() == "#|open:a\nx = 2\n#|close:a\n"
+    assert runner.run(jobs).skipped == 1
+
+
+def test_response_without_sections_is_retried(tmp_path, monkeypatch):
+    runner = make_runner(tmp_path, monkeypatch, "Sorry, I can't help with that.")
+    jobs = [Job(id="job", instruction="Change x", tags=["a"])]
+    result = runner.run_job(jobs[0])
+    assert (result.status, result.missing) == ("failed", ["a"])
+    assert "a" in result.error
+    runner._record(result)
+    assert runner.run(jobs).skipped == 0
+
+
+def test_job_id_with_path_separator(tmp_path, monkeypatch):
+    runner = make_runner(tmp_path, monkeypatch, "#|open:a\nx = 2\n#|close:a")
+    result = runner.run_job(Job(id="fix/a", instruction="Change x", tags=["a"]))
+    assert (result.status, result.error) == ("applied", None)
+    assert (tmp_path / "out" / "fix_a" / "batch-fix_a.json").exists()
@@ -0,0 +1,45 @@
+from coderip.conversation import Conversation
+
+SECTIONS = {"a": "2: x = 1\n"}
+RELATED = {"b.py:helper": "# b.py helper (callee)\ndef helper(value):\n    return value * 2"}
+
+
+def test_unchanged_related_is_not_resent(tmp_path):
+    conversation = Conversation("c", directory=str(tmp_path))
+    first = conversation.add_user_turn("Change x", SECTIONS, related=RELATED)
+    assert "def helper(value)" in first.content
+    conversation.add_assistant_turn("#|open:a\nx = 2\n#|close:a")
+
+    second = conversation.add_user_turn("Again", SECTIONS, related=RELATED)
+    assert "Related definitions" not in second.content
+    assert second.related == {}
+
+
+def test_changed_related_is_resent(tmp_path):
+    conversation = Conversation("c", directory=str(tmp_path))
+    conversation.add_user_turn("Change x", SECTIONS, related=RELATED)
+    changed = dict(RELATED, **{"b.py:helper": RELATED["b.py:helper"].replace("2", "3")})
+    changed["c.py:other"] = "# c.py other (caller)\ndef other(): ..."
+
+    turn = conversation.add_user_turn("Again", SECTIONS, related=changed)
+    assert "value * 3" in turn.content and "def other()" in turn.content
+    assert set(turn.related) == {"b.py:helper", "c.py:other"}
+
+
+def test_trimmed_related_is_resent(tmp_path):
+    conversation = Conversation("c", max_tokens=200, directory=str(tmp_path))
+    conversation.add_user_turn("Change x", SECTIONS, related=RELATED)
+    conversation.add_assistant_turn("y" * 600)
+    assert conversation.sent_related == {}
+
+    turn = conversation.add_user_turn("Again", SECTIONS, related=RELATED)
+    assert "def helper(value)" in turn.content
+
+
+def test_sent_related_survives_reload(tmp_path):
+    conversation = Conversation("c", directory=str(tmp_path))
+    conversation.add_user_turn("Change x", SECTIONS, related=RELATED)
+    conversation.save()
+
+    loaded = Conversation.load("c", directory=str(tmp_path))
+    assert "Related definitions" not in loaded.add_user_turn("Again", SECTIONS, related=RELATED).content
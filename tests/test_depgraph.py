@@ -0,0 +1,155 @@
+import textwrap
+
+import pytest
+
+from coderip.depgraph import DependencyIndex, parse_symbols, related_blocks
+from coderip.providers import estimate_tokens
+
+
+def symbols(source: str):
+    return parse_symbols("m.py", textwrap.dedent(source))
+
+
+def test_definitions():
+    definitions, _ = symbols('''
+        LIMIT = 3
+
+        @decorator
+        def f(value):
+            """Does f."""
+            def inner():
+                return value
+            return inner()
+
+        class C(Base):
+            def method(self):
+                pass
+    ''')
+    assert [(d.qualname, d.kind, d.start, d.end) for d in definitions] == [
+        ("LIMIT", "variable", 2, 2),
+        ("f", "function", 4, 9),
+        ("f.inner", "function", 7, 8),
+        ("C", "class", 11, 13),
+        ("C.method", "function", 12, 13),
+    ]
+    assert definitions[1].signature == 'def f(value):\n    """Does f."""\n    ...'
+    assert definitions[3].signature == "class C(Base):\n    def method(self): ..."
+
+
+def test_local_names_are_not_references():
+    _, references = symbols('''
+        def f(value, scale=LIMIT):
+            total = helper(value)
+            square = lambda x: x * x + offset
+            def inner():
+                return total + other()
+            return square(total) * scale
+    ''')
+    assert set(references) == {"LIMIT", "helper", "offset", "other"}
+    assert references["helper"] == [3]
+
+
+def test_stdlib_attributes_are_not_references():
+    _, references = symbols('''
+        import os
+        import numpy as np
+        from b import util
+
+        def f(path):
+            return os.path.join(path, util.run(np.zeros(1)))
+    ''')
+    assert "join" not in references and "path" not in references
+    assert {"run", "zeros", "util"} <= set(references)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sources = {
+        "a.py": '''
+            from b import helper
+
+            def selected(value):
+                return helper(value) + LIMIT
+
+            LIMIT = 3
+        ''',
+        "b.py": '''
+            def helper(value):
+                """Doubles value."""
+                total = value * 2
+                return total
+        ''',
+        "c.py": '''
+            from a import selected
+
+            def uses_selected():
+                return selected(2)
+        ''',
+        # Has its own `helper`, so its callers don't call ours
+        "d.py": '''
+            def helper():
+                pass
+
+            def unrelated():
+                return helper()
+        ''',
+    }
+    index = DependencyIndex(cache_path=None)
+    for path, source in sources.items():
+        (tmp_path / path).write_text(textwrap.dedent(source).lstrip())
+        index.update_file(path)
+    return index
+
+
+def selection(index: DependencyIndex, qualname: str):
+    definition = next(d for symbols in index.files.values() for d in symbols.definitions if d.qualname == qualname)
+    return definition.path, definition.start, definition.end
+
+
+def relations(related):
+    return {(item.definition.path, item.definition.qualname, item.relation) for item in related}
+
+
+def test_callees_and_callers(index):
+    related = index.related([selection(index, "selected")], budget=10_000)
+    assert relations(related) == {
+        # The local `LIMIT`, and every `helper` since imports aren't resolved
+        ("a.py", "LIMIT", "callee"),
+        ("b.py", "helper", "callee"),
+        ("d.py", "helper", "callee"),
+        ("c.py", "uses_selected", "caller"),
+    }
+    # Callees first
+    assert related[-1].relation == "caller"
+    assert all(item.full for item in related)
+    assert "total = value * 2" in next(item.text for item in related if item.definition.path == "b.py")
+
+
+def test_callers_of_a_shadowed_name(index):
+    # d.py calls its own `helper`
+    related = index.related([selection(index, "helper")], budget=10_000)
+    assert relations(related) == {("a.py", "selected", "caller")}
+
+
+def test_budget_signatures_before_bodies(index):
+    everything = index.related([selection(index, "selected")], budget=10_000)
+    signatures = sum(estimate_tokens(item.definition.signature) for item in everything)
+
+    related = index.related([selection(index, "selected")], budget=signatures)
+    assert len(related) == len(everything)
+    assert all(item.text == item.definition.signature for item in related if not item.full)
+    # Only bodies no longer than their signatures still fit
+    full = {(item.definition.path, item.definition.qualname) for item in related if item.full}
+    assert full == {("a.py", "LIMIT"), ("d.py", "helper")}
+
+    first = estimate_tokens(everything[0].definition.signature)
+    assert len(index.related([selection(index, "selected")], budget=first)) == 1
+    assert index.related([selection(index, "selected")], budget=0) == []
+
+
+def test_related_blocks_are_stable(index):
+    blocks = related_blocks(index.related([selection(index, "selected")], budget=10_000))
+    assert set(blocks) == {"a.py:LIMIT", "b.py:helper", "d.py:helper", "c.py:uses_selected"}
+    assert blocks["b.py:helper"].startswith("# b.py helper (callee)\ndef helper(value):")
+    assert blocks == related_blocks(index.related([selection(index, "selected")], budget=10_000))
@@ -0,0 +1,127 @@
+import os
+import random
+import zlib
+
+import pytest
+
+from coderip import fileindex
+from coderip.fileindex import FileIndex
+
+
+@pytest.fixture(autouse=True)
+def small_checkpoints(monkeypatch):
+    # Many chunks even in small files
+    monkeypatch.setattr(fileindex, "CHECKPOINT_BYTES", 64)
+
+
+def make_text(sections: int = 20) -> str:
+    lines = []
+    for i in range(sections):
+        lines += [f"#|open:s{i}", *(f"line_{i}_{j} = {j}" for j in range(i % 5 + 1)), f"#|close:s{i}", ""]
+    return "\n".join(lines) + "\n"
+
+
+def assert_same(index: FileIndex, path: str):
+    """Checks `index` against a fresh build of `path`.
+
+    Checkpoints may sit elsewhere than in a fresh build, but each must be a
+    line start with the right line number and chunk hash.
+    """
+    fresh = FileIndex.build(path)
+    assert index.size == fresh.size
+    assert index.line_count == fresh.line_count
+    assert index.events == fresh.events
+    assert index.sections() == fresh.sections()
+
+    with open(path, "rb") as file:
+        data = file.read()
+    offsets, lines = list(index.checkpoint_offsets), list(index.checkpoint_lines)
+    assert offsets == sorted(set(offsets))
+    for offset, line in zip(offsets, lines):
+        assert offset == 0 or data[offset - 1:offset] == b"\n"
+        assert line == data[:offset].count(b"\n")
+    ends = offsets[1:] + [len(data)]
+    expected_hashes = [zlib.crc32(data[start:end]) for start, end in zip(offsets, ends) if end > start]
+    assert list(index.chunk_hashes) == expected_hashes
+    for start, end, _ in index.sections():
+        assert index.read_lines(path, start, end) == fresh.read_lines(path, start, end)
+
+
+def rewrite(path, text: str, index: FileIndex) -> FileIndex:
+    with open(path, "w") as file:
+        file.write(text)
+    # Make sure the change is seen even within the mtime resolution
+    os.utime(path, (index.mtime + 1, index.mtime + 1))
+    return index.update(path)
+
+
+def edit(tmp_path, before: str, after: str) -> FileIndex:
+    path = tmp_path / "f.py"
+    path.write_text(before)
+    index = FileIndex.build(path)
+    updated = rewrite(path, after, index)
+    assert_same(updated, path)
+    return updated
+
+
+def test_append(tmp_path):
+    text = make_text()
+    updated = edit(tmp_path, text, text + "#|open:new\nx = 1\n#|close:new\n")
+    assert updated.sections()[-1][2] == "new"
+    # Only the end of the file is parsed again
+    assert updated.parsed_bytes < len(text) // 2
+
+
+def test_truncate(tmp_path):
+    text = make_text()
+    edit(tmp_path, text, text[:len(text) // 3])
+    edit(tmp_path, text, text[:-1])
+
+
+def test_delete_across_chunks(tmp_path):
+    text = make_text()
+    start = len(text) // 4
+    updated = edit(tmp_path, text, text[:start] + text[start + 300:])
+    assert len(updated.sections()) < 20
+
+
+def test_insert_across_chunks(tmp_path):
+    text = make_text()
+    middle = text.index("#|open:s10")
+    edit(tmp_path, text, text[:middle] + "".join(f"inserted_{i} = {i}\n" for i in range(30)) + text[middle:])
+
+
+def test_tag_insertion_and_removal(tmp_path):
+    text = make_text()
+    middle = text.index("#|open:s10")
+    added = edit(tmp_path, text, text[:middle] + "#|open:extra\ny = 2\n#|close:extra\n" + text[middle:])
+    assert "extra" in [label for _, _, label in added.sections()]
+
+    removed = edit(tmp_path, text, text.replace("#|close:s10\n", ""))
+    assert "s10" not in [label for _, _, label in removed.sections()]
+
+
+def test_sections_shift_with_inserted_lines(tmp_path):
+    text = make_text()
+    path = tmp_path / "f.py"
+    path.write_text(text)
+    index = FileIndex.build(path)
+    before = {label: (start, end) for start, end, label in index.sections()}
+    updated = rewrite(path, "import os\nimport sys\n" + text, index)
+    after = {label: (start, end) for start, end, label in updated.sections()}
+    assert after == {label: (start + 2, end + 2) for label, (start, end) in before.items()}
+
+
+def test_random_edits(tmp_path):
+    rng = random.Random(0)
+    path = tmp_path / "f.py"
+    text = make_text()
+    path.write_text(text)
+    index = FileIndex.build(path)
+    for _ in range(200):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.choice([0, 1, 10, 100, 500]))
+        insert = rng.choice(["", "x = 1\n", "#|open:r\n", "#|close:r\n", "\n" * 3, "y" * 150])
+        text = text[:start] + insert + text[end:] or "\n"
+        index = rewrite(path, text, index)
+        assert_same(index, path)
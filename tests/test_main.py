@@ -0,0 +1,70 @@
+import time
+
+from coderip import main
+from coderip.conversation import Conversation
+from coderip.edits import apply_to_files
+from coderip.main import TagFinder, get_edits, get_sections, get_verified_response, update_source_files
+from coderip.mock_server import MockLLMServer
+from coderip.providers import LocalProvider
+from coderip.verify import Verifier
+
+
+def test_get_sections_skips_unknown_tags(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.py").write_text("#|open:a\nx = 1\n#|close:a\n")
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory(".")
+    assert get_sections(tag_finder, ["a", "missing"]) == {"a": "2: x = 1\n"}
+
+
+def test_get_edits_only_selected_tags(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.py").write_text("#|open:outer\nx = 1\n#|open:inner\ny = 2\n#|close:inner\n#|close:outer\n")
+    (tmp_path / "g.py").write_text("#|open:other\nz = 3\n#|close:other\n")
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory(".")
+    response = (
+        "#|open:outer\nx = 10\n#|open:inner\ny = 20\n#|close:inner\n#|close:outer\n"
+        "#|open:other\nz = 30\n#|close:other\n"
+    )
+    edits = get_edits(tag_finder, ["outer"], response)
+    assert [edit.label for edit in edits] == ["outer"]
+    apply_to_files(edits)
+    assert (tmp_path / "f.py").read_text() == (
+        "#|open:outer\nx = 10\n#|open:inner\ny = 20\n#|close:inner\n#|close:outer\n"
+    )
+    assert (tmp_path / "g.py").read_text() == "#|open:other\nz = 3\n#|close:other\n"
+
+
+def test_update_source_files_strips_line_numbers_of_edited_code(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.py").write_text("#|open:a\ndef f():\n    return 1\n#|close:a\n")
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory(".")
+    sections = get_sections(tag_finder, ["a"])
+    assert sections == {"a": "2: def f():\n3:     return 1\n"}
+    # A line inserted without a number
+    response = "#|open:a\n2: def f():\n    x = 1\n3:     return x\n#|close:a"
+    update_source_files(tag_finder, ["a"], response)
+    assert (tmp_path / "f.py").read_text() == "#|open:a\ndef f():\n    x = 1\n    return x\n#|close:a\n"
+
+
+def test_verified_candidates_run_in_parallel_slots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "f.py").write_text("#|open:a\nx = 1\n#|close:a\n")
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory(".")
+    conversation = Conversation("verify", directory=str(tmp_path / "sessions"))
+    sections = get_sections(tag_finder, ["a"])
+    conversation.add_user_turn("Change x", sections)
+    sent_sections = {"a": tag_finder.get_code_by_label("a", numbered=False)}
+    verifier = Verifier(".", "true", parallel=4, isolation="hardlink", log_dir=str(tmp_path / "logs"))
+
+    with MockLLMServer(latency=0.3, slots=4) as server:
+        monkeypatch.setattr(main, "get_default_provider", lambda: LocalProvider(base_url=server.url, slots=4))
+        start = time.perf_counter()
+        response = get_verified_response(tag_finder, conversation, ["a"], sent_sections, verifier, candidates=4)
+        elapsed = time.perf_counter() - start
+    assert "x = 1" in response
+    # One after another, the four requests would take 1.2s
+    assert elapsed < 0.9
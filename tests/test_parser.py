@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from coderip.parser import parse_response, strip_line_numbers
+from parser_corpus import CASES
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["name"] for case in CASES])
+def test_corpus(case):
+    parsed = parse_response(case["response"], labels=case["labels"], first_lines=case.get("first_lines"))
+    assert parsed.sections == case["expected"]
+    assert parsed.missing(case["labels"]) == [label for label in case["labels"] if label not in case["expected"]]
+
+
+def test_recoveries_are_reported():
+    parsed = parse_response("#|open:foo\nx = 1", labels=["foo"])
+    assert parsed.sections == {"foo": "x = 1"}
+    assert parsed.issues == ["Missing close tag for 'foo' (end of response)"]
+
+
+def test_missing_labels():
+    parsed = parse_response("#|open:foo\nx = 1\n#|close:foo", labels=["foo", "bar"])
+    assert parsed.missing(["foo", "bar"]) == ["bar"]
+
+
+def test_strip_line_numbers():
+    assert strip_line_numbers(["3: a = 1", "4: ", "5: b = 2"]) == ["a = 1", "", "b = 2"]
+    # Not every line numbered
+    assert strip_line_numbers(["d = {", "1: 'a',", "2: 'b',", "}"]) == ["d = {", "1: 'a',", "2: 'b',", "}"]
+    # Not consecutive
+    assert strip_line_numbers(["1: 'a',", "3: 'b',"]) == ["1: 'a',", "3: 'b',"]
@@ -0,0 +1,74 @@
+import pytest
+
+from coderip.mock_server import MockLLMServer
+from coderip.providers import LocalProvider, ModelError
+
+SYSTEM = {"role": "system", "content": "You are a careful programmer. " * 50}
+
+
+def messages(request: str) -> list:
+    return [SYSTEM, {"role": "user", "content": request}]
+
+
+@pytest.fixture(scope="module")
+def mock_server():
+    with MockLLMServer(slots=2) as server:
+        yield server
+
+
+@pytest.fixture
+def server(mock_server):
+    mock_server.down = False
+    for slot in mock_server.slots:
+        slot.prompt = ""
+    return mock_server
+
+
+def test_echoes_sections(server):
+    provider = LocalProvider(base_url=server.url, model="mock")
+    response = provider.complete(messages("#|open:foo\nx = 1\n#|close:foo"))
+    assert response.provider == "local"
+    assert response.model == "mock"
+    assert "#|open:foo\nx = 1\n#|close:foo" in response.content
+    assert response.prompt_tokens > 0
+    assert response.completion_tokens > 0
+
+
+def test_prompt_cache_reused(server):
+    provider = LocalProvider(base_url=server.url, model="mock", slots=2)
+    first = provider.complete(messages("first request"), session="a")
+    second = provider.complete(messages("second request"), session="a")
+    assert first.cached_tokens == 0
+    # The shared system message is served from the slot's cache
+    assert second.cached_tokens >= len(SYSTEM["content"]) // 4
+    assert second.cached_tokens < second.prompt_tokens
+
+
+def test_prompt_cache_disabled(server):
+    provider = LocalProvider(base_url=server.url, model="mock", cache_prompt=False)
+    provider.complete(messages("first request"))
+    assert provider.complete(messages("second request")).cached_tokens == 0
+
+
+def test_sessions_pinned_to_slots(server):
+    provider = LocalProvider(base_url=server.url, model="mock", slots=2)
+    assert provider._extra_body(None) == {"cache_prompt": True}
+    slot = provider._extra_body("session")["id_slot"]
+    assert slot in (0, 1)
+    assert provider._extra_body("session")["id_slot"] == slot
+
+    # Interleaved sessions on different slots don't evict each other's cache
+    sessions = ["a", "b"]
+    while provider._extra_body(sessions[0])["id_slot"] == provider._extra_body(sessions[1])["id_slot"]:
+        sessions[1] += "b"
+    other = {"role": "system", "content": "Something else entirely. " * 50}
+    provider.complete(messages("request"), session=sessions[0])
+    provider.complete([other, {"role": "user", "content": "request"}], session=sessions[1])
+    assert provider.complete(messages("request"), session=sessions[0]).cached_tokens > 0
+
+
+def test_server_error_raises_model_error(server):
+    server.down = True
+    provider = LocalProvider(base_url=server.url, model="mock")
+    with pytest.raises(ModelError):
+        provider.complete(messages("request"))
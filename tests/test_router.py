@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from coderip.mock_server import MockLLMServer
+from coderip.providers import LocalProvider, ModelError
+from coderip.router import ProviderRouter
+
+MESSAGES = [{"role": "user", "content": "#|open:foo\nx = 1\n#|close:foo"}]
+
+
+@pytest.fixture(scope="module")
+def servers():
+    with MockLLMServer() as primary, MockLLMServer() as backup:
+        yield primary, backup
+
+
+@pytest.fixture
+def primary(servers):
+    server = servers[0]
+    server.down, server.slow_rate, server.slow_latency = False, 0.0, 0.0
+    return server
+
+
+@pytest.fixture
+def backup(servers):
+    servers[1].down = False
+    return servers[1]
+
+
+def make_router(primary: MockLLMServer, backup: MockLLMServer, **kwargs) -> ProviderRouter:
+    return ProviderRouter(
+        [LocalProvider(base_url=primary.url, model="primary"), LocalProvider(base_url=backup.url, model="backup")],
+        **kwargs,
+    )
+
+
+def test_primary_preferred(primary, backup):
+    assert make_router(primary, backup).complete(MESSAGES).model == "primary"
+
+
+def test_failover_when_primary_down(primary, backup):
+    primary.down = True
+    router = make_router(primary, backup)
+    response = router.complete(MESSAGES)
+    assert response.model == "backup"
+    assert "x = 1" in response.content
+
+    stats = list(router.stats.values())
+    assert (stats[0].errors, stats[1].errors) == (1, 0)
+    # Once its error rate is too high, the primary is tried last
+    for _ in range(2):
+        router.complete(MESSAGES)
+    assert [provider.model for provider in router.ranked()] == ["backup", "primary"]
+
+
+def test_hedging_when_primary_slow(primary, backup):
+    primary.slow_rate, primary.slow_latency = 1.0, 1.0
+    router = make_router(primary, backup, hedge_after=0.05)
+    start = time.perf_counter()
+    response = router.complete(MESSAGES)
+    assert response.model == "backup"
+    assert time.perf_counter() - start < primary.slow_latency
+
+
+def test_no_hedging_without_hedge_after(primary, backup):
+    primary.slow_rate, primary.slow_latency = 1.0, 0.2
+    assert make_router(primary, backup).complete(MESSAGES).model == "primary"
+
+
+def test_model_error_when_all_fail(primary, backup):
+    primary.down = backup.down = True
+    with pytest.raises(ModelError, match="All providers failed"):
+        make_router(primary, backup).complete(MESSAGES)
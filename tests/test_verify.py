@@ -0,0 +1,38 @@
+import sys
+
+from coderip.edits import Edit
+from coderip.verify import Verifier
+
+CHECK = "import sys\n#|open:verdict\nPASS = False\n#|close:verdict\nsys.exit(0 if PASS else 1)\n"
+
+
+def make_verifier(tmp_path, command: str) -> Verifier:
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    (source_dir / "check.py").write_text(CHECK)
+    return Verifier(str(source_dir), command, parallel=2, isolation="hardlink", log_dir=str(tmp_path / "logs"))
+
+
+def test_first_passing_candidate(tmp_path):
+    verifier = make_verifier(tmp_path, f"{sys.executable} check.py")
+    path = verifier.source_dir + "/check.py"
+    report = verifier.verify({
+        "fails": [Edit(path=path, code="PASS = False", label="verdict")],
+        "passes": [Edit(path=path, code="PASS = True", label="verdict")],
+    }, wait_all=True)
+    assert report.first_passed == "passes"
+    assert {result.candidate: result.status for result in report.results}["fails"] == "failed (exit code 1)"
+    # The source directory is left alone
+    assert (tmp_path / "src" / "check.py").read_text() == CHECK
+
+
+def test_candidates_without_edits_fail_without_running(tmp_path):
+    verifier = make_verifier(tmp_path, "true")
+    path = verifier.source_dir + "/check.py"
+    report = verifier.verify({
+        "empty": [],
+        "partial": [Edit(path=path, code="PASS = True", label="verdict")],
+    }, wait_all=True, labels=["verdict", "other"])
+    assert report.first_passed is None
+    statuses = {result.candidate: result.status for result in report.results}
+    assert statuses == {"empty": "error: no edits", "partial": "error: no edits for other"}
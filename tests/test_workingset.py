@@ -0,0 +1,66 @@
+import os
+import subprocess
+
+import pytest
+
+from coderip.main import TagFinder
+from coderip.workingset import get_working_set, parse_porcelain, read_index
+
+
+def git(directory, *args) -> str:
+    return subprocess.run(
+        ["git", "-C", str(directory), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        check=True, stdout=subprocess.PIPE,
+    ).stdout.decode()
+
+
+@pytest.fixture
+def repository(tmp_path):
+    root = tmp_path / "repo"
+    (root / "sub").mkdir(parents=True)
+    # Names of several lengths, to exercise the v2 padding
+    for name in ("a.py", "sub/bb.py", "sub/abcdefg.py", "sub/abcdefgh_long_name.py", "sub/abcdefgi.py"):
+        (root / name).write_text(f"#|open:{os.path.basename(name)[:-3]}\nx = 1\n#|close:{os.path.basename(name)[:-3]}\n")
+    git(root, "init", "-q")
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", "files")
+    return root
+
+
+def test_parse_porcelain():
+    output = b" M a.py\0R  new name.py\0old name.py\0?? dir/c.py\0A  d.py\0"
+    assert parse_porcelain(output) == [(" M", "a.py"), ("R ", "new name.py"), ("??", "dir/c.py"), ("A ", "d.py")]
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_read_index(repository, version):
+    if version == 3:
+        # Intent-to-add entries carry the extended flags of v3
+        (repository / "sub" / "new.py").write_text("y = 2\n")
+        git(repository, "add", "-N", "sub/new.py")
+    else:
+        git(repository, "update-index", "--index-version", str(version))
+    entries = read_index(os.path.join(repository, ".git"))
+    assert [entry.path for entry in entries] == git(repository, "ls-files").splitlines()
+    sizes = {entry.path: entry.size for entry in entries}
+    assert sizes["a.py"] == os.path.getsize(repository / "a.py")
+
+
+def test_working_set_through_symlink(repository, tmp_path, monkeypatch):
+    link = tmp_path / "link"
+    link.symlink_to(repository)
+    (repository / "sub" / "bb.py").write_text("#|open:bb\nx = 2\n#|close:bb\n")
+    (repository / "untracked.py").write_text("z = 3\n")
+
+    working_set = get_working_set(str(link / "sub"))
+    assert working_set.changes == {str(link / "sub" / "bb.py"): " M"}
+    # Recently touched files outside the directory are left out
+    assert set(working_set.paths) == {str(link / "sub" / name) for name in os.listdir(repository / "sub")}
+
+    monkeypatch.chdir(tmp_path)
+    tag_finder = TagFinder(display=False)
+    tag_finder.scan_directory("link")
+    tag_finder.backfill_completed.wait()
+    paths = sorted(file.path for file in tag_finder.tag_data)
+    assert paths == sorted(os.path.join("link", name) for name in ("a.py", "untracked.py", *(
+        os.path.join("sub", name) for name in os.listdir(repository / "sub"))))